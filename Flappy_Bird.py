@@ -1,17 +1,35 @@
 from pathlib import Path
-from pygame import mixer, image
+from pygame import mixer
 from classes import *
+from atlas import init_atlas
 from qlearn_agent import *
+from replay_buffer import ReplayBuffer
+from planner import PrioritizedSweeping
+from checkpoint import CheckpointStore
+from io_worker import IOWorker
+from progress import ProgressReporter
+from game_rng import GameRNG
+from frame_timer import FrameTimer
 import matplotlib.pyplot as plt
-import pandas as pd
+import metrics_log
+import time
 
 DISPLAYING = True
 EPISODES_BEFORE_DISPLAY = 3000
 PERIOD = 5
+SPEED = 1  # game frames per timer tick while displaying, see keyboard() to change it at runtime
+MAX_SPEED = 256  # highest "speed": its frames take a few ms of a timer tick, the window stays responsive
+MAX_SPEED_TICK = 0.03  # seconds of game frames per timer tick when nothing is displayed (the window stays responsive)
+REPLAY = 0  # number of stored transitions replayed after every real one while learning (0: no replay)
+PLANNING = 0  # number of model-based backups after every real transition while learning (0: no planning)
+REPORT_JSON = False  # progress reports as JSON records instead of text lines (see progress.py)
+CHECKPOINT_PERIOD = 0  # episodes between two versioned snapshots of a memory-mapped Q-table while learning (0: off)
+SEED = None  # seed of the pipes and of the agent's random draws: the same seed plays the same episodes (None: a new one)
+FRAME_TIMING = False  # per-phase frame timers, an FPS overlay and frame_times.json at exit (see frame_timer.py)
 
 
 def plot():
-    data = pd.read_csv(csv_file)
+    data = metrics_log.load(log_file)
 
     episode_data = data["episode"].tolist()
     score_data = data["score"].tolist()
@@ -102,6 +120,8 @@ class FlappyBirdGame:
     def __init__(self):
         self.cur_path = str(Path(__file__).parent.resolve())
         self.PERIOD = PERIOD if DISPLAYING else 0
+        self.speed = SPEED
+        self.max_speed = False  # run unrendered as fast as possible (key '0')
         # ######## to control the game ###############
         self.GAME_STATES = ["welcome", "main", "over"]
         self.STATE_SEQUENCE = cycle([1, 2, 0])
@@ -110,16 +130,12 @@ class FlappyBirdGame:
         self.DISTANCE = SCREENWIDTH / 2  # distance between pipes
         self.SCORE = 0
         self.previous_score = 0
-        try:
-            data = pd.read_csv(csv_file)
-            self.highest_score = data["score"].max()
-        except FileNotFoundError:
-            data = pd.DataFrame({"episode": [0], "score": [0]})
-            # Append the data to the CSV file
-            data.to_csv(csv_file, mode="a", index=False, header=True)
-            self.highest_score = 0
-        self.csv_episodes = []
-        self.csv_score = []
+        self.io = IOWorker()  # disk writes and prints leave the frame loop
+        self.metrics = metrics_log.MetricsLog(log_file, csv_file, self.io)  # an old CSV log is converted once
+        self.highest_score = self.metrics.highest_score
+        self.progress = ProgressReporter(lambda text: self.io.submit(print, text), as_json=REPORT_JSON)
+        self.progress.highest_score = self.highest_score
+        self.episode_frames = 0  # frames played in the current episode
         self.BP_SPEED = -4
         # ######## bird's control ########################
         self.ANGULAR_SPEED = 3
@@ -127,23 +143,24 @@ class FlappyBirdGame:
         self.JUMP_VELOCITY = 3
         self.GRAVITY = -0.2
         ###################################################
-        self.pipes = []  # contains all displayed pipes on the screen
+        self.pipes = None  # contains all displayed pipes on the screen (a PipeRing, the pipes are reused)
         self.bird = None
         self.base = None
         self.window = None
         self.is_window_open = True
         ###########################################
-        self.TEXTURES = {}  # at the start of game, all textures will be created once time and saved in it.
+        self.TEXTURES = {}  # at the start of game, the atlas regions of all the sprites are saved in it.
         self.SOUNDS = {}
-        self.PLAYERS_LIST = (
-            self.cur_path + '/assets/sprites/up.png',
-            self.cur_path + '/assets/sprites/mid.png',
-            self.cur_path + '/assets/sprites/down.png')
         ##################################################
         self.frames_per_step = 5  # number of frames after it the agent will take a decision
         self.counter = self.frames_per_step  # counter down to accumulate the number of frames
         self.agent = None
         self.next_pipe = None  # the pipe that the bird should focus on
+        self.q_table = None  # the live memory-mapped table when checkpoints are on
+        self.checkpoints = None  # CheckpointStore of the live table (CHECKPOINT_PERIOD)
+        self.obs = Observation()  # what the agent sees at a decision, refilled by observe()
+        self.rng = GameRNG(SEED, GAP_RANGE)  # every random draw of the game (see game_rng.py)
+        self.timer = None  # FrameTimer (FRAME_TIMING)
 
         self.run()
 
@@ -168,9 +185,12 @@ class FlappyBirdGame:
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
+        self.batch = SpriteBatch()
         self.init_texture()
         self.init_sounds()
         self.init_objects()
+        if FRAME_TIMING:
+            self.init_timer()
 
         glMatrixMode(GL_PROJECTION)
         glLoadIdentity()
@@ -188,191 +208,89 @@ class FlappyBirdGame:
         self.SOUNDS["point"] = mixer.Sound(self.cur_path + "/assets/audio/point" + SOUNDEXT)
 
     def init_texture(self):
-        # Initialize textures
-        # ################### Pipe Textures ###########################################################
-        img_pipe_load = image.load(self.cur_path + '/assets/sprites/pipe-green.png')
-        width = img_pipe_load.get_width()
-        height = img_pipe_load.get_height()
-        img_pipe = [
-            image.tostring(img_pipe_load, "RGBA", True),  # lower image
-            image.tostring(img_pipe_load, "RGBA", False)]  # upper image "image is reflected".
-
-        # creating 2 textures for pipes
-        tex = glGenTextures(2)
-        # adjust texture and uploading its image
-        for i in [0, 1]:
-            glBindTexture(GL_TEXTURE_2D, tex[i])
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-            gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width, height, GL_RGBA, GL_UNSIGNED_BYTE, img_pipe[i])
-
-        self.TEXTURES["pipe"] = tex
-        # ################### Bird Textures ############################################################
-        img_bird_load = [image.load(Address) for Address in self.PLAYERS_LIST]
-        width = [img.get_width() for img in img_bird_load]
-        height = [img.get_height() for img in img_bird_load]
-        img_bird = [image.tostring(img, "RGBA", True) for img in img_bird_load]
-
-        # creating 3 textures for bird
-        tex = glGenTextures(3)
-        # adjust texture and uploading its image
-        for i in [0, 1, 2]:
-            glBindTexture(GL_TEXTURE_2D, tex[i])
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-            gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width[i], height[i], GL_RGBA, GL_UNSIGNED_BYTE, img_bird[i])
-
-        self.TEXTURES["bird"] = tex
-        # ################### Background Texture ############################################################
-        img_backG_load = image.load(self.cur_path + '/assets/sprites/background-day.png')
-        width = img_backG_load.get_width()
-        height = img_backG_load.get_height()
-        img_backG = image.tostring(img_backG_load, "RGBA", True)
-
-        # creating 1 texture for BackG
-        tex = glGenTextures(1)
-        # adjust texture and uploading its image
-        glBindTexture(GL_TEXTURE_2D, tex)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width, height, GL_RGBA, GL_UNSIGNED_BYTE, img_backG)
-
-        self.TEXTURES["BackG"] = tex
-        # ################### numbers Textures ############################################################
-        img_num_load = [image.load(self.cur_path + f'/assets/sprites/{i}.png') for i in range(10)]
-        width = [img.get_width() for img in img_num_load]
-        height = [img.get_height() for img in img_num_load]
-        img_num = [image.tostring(img, "RGBA", True) for img in img_num_load]
-
-        # creating 10 textures for numbers
-        tex = glGenTextures(10)
-        # adjust texture and uploading its image
-        for i in range(10):
-            glBindTexture(GL_TEXTURE_2D, tex[i])
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-            gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width[i], height[i], GL_RGBA, GL_UNSIGNED_BYTE, img_num[i])
-
-        self.TEXTURES["numbers"] = {f'{i}': tex[i] for i in range(10)}
-        # ################### base Texture ############################################################
-        img_base_load = image.load(self.cur_path + '/assets/sprites/base.png')
-        width = img_base_load.get_width()
-        height = img_base_load.get_height()
-        img_base = image.tostring(img_base_load, "RGBA", True)
-
-        # creating 1 texture
-        tex = glGenTextures(1)
-        # adjust texture and uploading its image
-        glBindTexture(GL_TEXTURE_2D, tex)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width, height, GL_RGBA, GL_UNSIGNED_BYTE, img_base)
-
-        self.TEXTURES["base"] = tex
-        # ################### message Texture ############################################################
-        img_msg_load = image.load(self.cur_path + '/assets/sprites/message.png')
-        width = img_msg_load.get_width()
-        height = img_msg_load.get_height()
-        img_msg = image.tostring(img_msg_load, "RGBA", True)
-
-        # creating 1 texture
-        tex = glGenTextures(1)
-        # adjust texture and uploading its image
-        glBindTexture(GL_TEXTURE_2D, tex)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width, height, GL_RGBA, GL_UNSIGNED_BYTE, img_msg)
-        # glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_msg)
-
-        self.TEXTURES["msg"] = tex
-        # ################### game over Texture ############################################################
-        img_gameO_load = image.load(self.cur_path + '/assets/sprites/gameover.png')
-        width = img_gameO_load.get_width()
-        height = img_gameO_load.get_height()
-        img_gameO = image.tostring(img_gameO_load, "RGBA", True)
-
-        # creating 1 texture
-        tex = glGenTextures(1)
-        # adjust texture and uploading its image
-        glBindTexture(GL_TEXTURE_2D, tex)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width, height, GL_RGBA, GL_UNSIGNED_BYTE, img_gameO)
-
-        self.TEXTURES["game over"] = tex
-        # ################### start Texture ############################################################
-        img_msg_load = image.load(self.cur_path + '/assets/sprites/start.png')
-        width = img_msg_load.get_width()
-        height = img_msg_load.get_height()
-        img_msg = image.tostring(img_msg_load, "RGBA", True)
-        # creating 1 texture
-        tex = glGenTextures(1)
-        # adjust texture and uploading its image
-        glBindTexture(GL_TEXTURE_2D, tex)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width, height, GL_RGBA, GL_UNSIGNED_BYTE, img_msg)
-
-        self.TEXTURES["start"] = tex
-        # ################### restart Texture ############################################################
-        img_msg_load = image.load(self.cur_path + '/assets/sprites/res.png')
-        width = img_msg_load.get_width()
-        height = img_msg_load.get_height()
-        img_msg = image.tostring(img_msg_load, "RGBA", True)
-        # creating 1 texture
-        tex = glGenTextures(1)
-        # adjust texture and uploading its image
-        glBindTexture(GL_TEXTURE_2D, tex)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width, height, GL_RGBA, GL_UNSIGNED_BYTE, img_msg)
-
-        self.TEXTURES["restart"] = tex
+        # all the sprites are packed into one texture, self.TEXTURES keeps their regions in it
+        self.batch.texture, self.TEXTURES = init_atlas(self.cur_path + '/assets/sprites')
 
     def init_objects(self):
-        self.pipes.append(Pipe(self.TEXTURES["pipe"]))
-        self.next_pipe = self.pipes[0]
+        self.pipes = PipeRing(lambda: Pipe(self.TEXTURES["pipe"], self.rng, spawn=False))
+        self.next_pipe = self.pipes.spawn()
         self.bird = Bird(self.TEXTURES["bird"], self.GRAVITY, self.ANGULAR_SPEED)
         self.bird.fly_speed = 0
         self.base = Base(self.TEXTURES["base"], 0.1)
-        self.agent = Q_learn(self.get_state())
+        if LEARNING and CHECKPOINT_PERIOD:
+            # resume from the live memory-mapped table (or the latest valid snapshot)
+            self.checkpoints = CheckpointStore("./checkpoints")
+            self.q_table = self.checkpoints.open(NUM_STATES + (NUM_ACTIONS,), "./q_table.npy")
+        if LEARNING and (REPLAY or PLANNING):
+            self.agent = FlatQ_learn(self.get_state(), self.q_table, self.rng)
+            if REPLAY:
+                self.agent.use_replay(ReplayBuffer(seed=self.rng.generator), REPLAY)
+            if PLANNING:
+                self.agent.use_planner(PrioritizedSweeping(self.agent.Q_flat, self.agent.gamma), PLANNING)
+        elif not LEARNING and not EXPLORATION:
+            self.agent = PolicyAgent(self.get_state(), self.q_table, self.rng)  # playing: decisions from the compiled greedy policy
+        else:
+            self.agent = Q_learn(self.get_state(), self.q_table, self.rng)
+        if self.checkpoints:
+            # after a crash the episodes log can be behind the snapshots (its buffered records are lost):
+            # the episode numbers go on from the newest snapshot, so the next ones are named after it
+            episode = max(self.agent.num_episodes, self.checkpoints.last_episode())
+            self.agent.num_episodes = self.agent.last_episode = episode
+
+    def init_timer(self):
+        # the timed methods are replaced on the instance: nothing changes when FRAME_TIMING is off
+        self.timer = FrameTimer()
+        self.update_frame = self.timer.wrap("update", self.update_frame)
+        self.agent_decide = self.timer.wrap("decide", self.agent_decide)
+        self.agent.learn_index = self.timer.wrap("learn", self.agent.learn_index)
+        self.draw = self.timer.wrap("draw", self.draw)
+        self.swap = self.timer.wrap("swap", self.swap)
 
     # control the game loop ################################################################
     def frames(self, t=1):
+        """
+        one timer tick: "speed" game frames then one display of the latest one,
+        or, when nothing is displayed, as many game frames as fit in MAX_SPEED_TICK.
+        """
         global DISPLAYING
-        if self.is_window_open:
-            if self.agent.num_episodes == self.agent.last_episode + EPISODES_BEFORE_DISPLAY:
-                DISPLAYING = True
-                self.PERIOD = PERIOD
-            if DISPLAYING:
-                self.display()
-            self.update_frame()
-            self.counter -= 1
-            glutTimerFunc(self.PERIOD, self.frames, t)
+        if not self.is_window_open:
+            return
+        rendering = DISPLAYING and not self.max_speed
+        if rendering:
+            for _ in range(self.speed):
+                self.step()
+            self.display()
+        else:
+            deadline = time.perf_counter() + MAX_SPEED_TICK
+            while time.perf_counter() < deadline:
+                for _ in range(100):
+                    self.step()
+        if self.timer:
+            self.timer.end_frame()
+        if not DISPLAYING and self.agent.num_episodes >= self.agent.last_episode + EPISODES_BEFORE_DISPLAY:
+            DISPLAYING = True
+            self.PERIOD = PERIOD
+        glutTimerFunc(self.PERIOD if rendering else 0, self.frames, t)
+
+    def step(self):
+        self.update_frame()
+        self.counter -= 1
+
+    def play(self, sound):
+        # silent when frames are skipped (speed > 1) or not displayed
+        if DISPLAYING and self.speed == 1 and not self.max_speed:
+            self.SOUNDS[sound].play()
 
     def display(self):
+        self.draw()
+        self.swap()
+
+    def draw(self):
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         glLoadIdentity()
+        self.batch.begin()  # the quads of this frame are drawn at once by batch.end()
         self.set_background()
-        self.base.draw()
+        self.base.draw(self.batch)
 
         if self.GAME_STATES[self.STATE_INDEX] == "welcome":
             self.welcome()
@@ -383,14 +301,18 @@ class FlappyBirdGame:
         elif self.GAME_STATES[self.STATE_INDEX] == "over":
             self.game_over()
 
+        if self.timer:
+            self.show_timing()
+        self.batch.end()
+
+    def swap(self):
         glutSwapBuffers()
 
     def update_frame(self):
         if self.GAME_STATES[self.STATE_INDEX] == "welcome":
             # start the game automatically
             if self.counter == 0:
-                if DISPLAYING:
-                    self.SOUNDS["jump"].play()
+                self.play("jump")
                 self.bird.reset()
                 self.bird.velocity = self.JUMP_VELOCITY  # make self.bird go up
                 self.STATE_INDEX = next(self.STATE_SEQUENCE)
@@ -400,13 +322,14 @@ class FlappyBirdGame:
         elif self.GAME_STATES[self.STATE_INDEX] == "main":
             # agent take decision
             if self.counter == 0:
-                state = self.get_state()
+                state_index = self.agent.index_observation(self.observe())
                 if LEARNING:
-                    self.agent.learn(state, self.get_reward())
-                self.agent_decide(state)
+                    self.agent.learn_index(state_index, self.get_reward())
+                self.agent_decide(state_index)
                 self.counter = self.frames_per_step
 
             # update the frame
+            self.episode_frames += 1
             self.base.move(self.BP_SPEED)
             for pipe in self.pipes:
                 pipe.move(self.BP_SPEED)
@@ -419,7 +342,7 @@ class FlappyBirdGame:
 
         elif self.GAME_STATES[self.STATE_INDEX] == "over":
             if LEARNING:
-                self.agent.learn(self.get_state(), self.get_reward(), done=True)
+                self.agent.learn_index(self.agent.index_observation(self.observe()), self.get_reward(), done=True)
             else:
                 self.agent.reset()
             self.reset()
@@ -427,13 +350,13 @@ class FlappyBirdGame:
     # ###################### Render game states ########################################
     def welcome(self):
         self.show_welcome()
-        self.bird.draw()
+        self.bird.draw(self.batch)
 
     def main_game(self):
         for pipe in self.pipes:
-            pipe.draw()
+            pipe.draw(self.batch)
         self.show_score(str(self.SCORE))
-        self.bird.draw()
+        self.bird.draw(self.batch)
 
     def game_over(self):
         self.show_game_over()
@@ -455,17 +378,16 @@ class FlappyBirdGame:
 
     def update_pipes(self):
         if self.pipes[0].right < 0:
-            self.pipes.pop(0)
+            self.pipes.popleft()
         if self.pipes[-1].left <= self.DISTANCE:
-            self.pipes.append(Pipe(self.TEXTURES["pipe"]))
+            self.pipes.spawn()
 
     def update_score(self):
         pipe = self.pipes[0]
         # increase score if all bird's body crossed the pipe's right side
         if not pipe.count and pipe.right <= self.bird.left:
             self.SCORE += 1
-            if DISPLAYING:
-                self.SOUNDS["point"].play()
+            self.play("point")
             pipe.count = True
             # make the agent focus on the next pipe
             self.next_pipe = self.pipes[1]
@@ -476,27 +398,30 @@ class FlappyBirdGame:
         take score as a string and display it.
         """
         width = 40
+        left = 0.5 * SCREENWIDTH - len(score) / 2 * width  # centre the text.
+        self.show_number(score, left, 0.85 * SCREENHEIGHT, width)
+
+    def show_number(self, number, left, bottom, width, z=0.5):
         height = width * 1.5
+        for n in number:
+            self.batch.add(left, left + width, bottom, bottom + height, self.TEXTURES["numbers"][n], z)
+            left += width  # to show numbers beside each other one, not over.
 
-        glPushMatrix()
-        glTranslate(-(len(score) / 2 + 1) * width, 0, 0)  # centre the text.
-        for n in score:
-            glTranslate(width, 0, 0)  # to show numbers beside each other one, not over.
-            draw_rectangle_with_tex(0.5 * SCREENWIDTH, 0.5 * SCREENWIDTH + width,
-                                    0.85 * SCREENHEIGHT, 0.85 * SCREENHEIGHT + height,
-                                    self.TEXTURES["numbers"][n], 0.5)
-        glPopMatrix()
+    def show_timing(self):
+        # top left: frames per second, under it the busy time of a frame (mean of the last ones) in microseconds
+        self.show_number(str(round(self.timer.fps)), 10, SCREENHEIGHT - 40, 20, 0.95)
+        self.show_number(str(round(self.timer.recent())), 10, SCREENHEIGHT - 75, 20, 0.95)
 
     def set_background(self):
-        draw_rectangle_with_tex(0, SCREENWIDTH, 0, SCREENHEIGHT + 5, self.TEXTURES["BackG"], -1)
+        self.batch.add(0, SCREENWIDTH, 0, SCREENHEIGHT + 5, self.TEXTURES["BackG"], -1)
 
     def show_game_over(self):
-        draw_rectangle_with_tex(100, 500, 400, 600, self.TEXTURES["game over"], 0.5)
-        draw_rectangle_with_tex(0, SCREENWIDTH, 0, BASEY + 200, self.TEXTURES["restart"], 0.9)
+        self.batch.add(100, 500, 400, 600, self.TEXTURES["game over"], 0.5)
+        self.batch.add(0, SCREENWIDTH, 0, BASEY + 200, self.TEXTURES["restart"], 0.9)
 
     def show_welcome(self):
-        draw_rectangle_with_tex(50, 550, 420, 720, self.TEXTURES["msg"], 0.5)
-        draw_rectangle_with_tex(0, SCREENWIDTH, 0, BASEY + 200, self.TEXTURES["start"], 0.2)
+        self.batch.add(50, 550, 420, 720, self.TEXTURES["msg"], 0.5)
+        self.batch.add(0, SCREENWIDTH, 0, BASEY + 200, self.TEXTURES["start"], 0.2)
 
     #################################################################################
     # AI agent methods ##############################################################
@@ -511,11 +436,16 @@ class FlappyBirdGame:
         }
         return state
 
+    def observe(self):
+        """the observation of the current frame in self.obs (one pass, no dict), used by the agent and get_reward()"""
+        return self.obs.update(self.bird, self.next_pipe)
+
     def get_reward(self):
-        state = self.get_state()
+        # reward of the frame last observed by observe()
+        obs = self.obs
 
         # if crashed ...........................
-        if state['game_state'] == 'over':
+        if self.GAME_STATES[self.STATE_INDEX] == 'over':
             return -200
 
         # if it didn't crash ...................
@@ -525,39 +455,27 @@ class FlappyBirdGame:
             reward += 100
             self.previous_score = self.SCORE
 
-        bird_centre = state['bird_y']
-        bird_v = state['bird_v']
-        gap_x = state['pipe_positions'][0] - self.next_pipe.width * 0.5
-        gap_y = state['pipe_positions'][1]
-        gap_top = self.next_pipe.upper_y
-        gap_down = self.next_pipe.lower_y
-        bird_height = self.bird.height
-        gap_size_quarter = self.next_pipe.gap_size * 0.35
-
+        region = obs.region
         # encourage the bird to be inside the scope of the gap
-        if gap_down + gap_size_quarter <= bird_centre <= gap_top - gap_size_quarter:
+        if region == Observation.SCOPE:
             reward += 60
-        elif gap_down + bird_height <= bird_centre <= gap_top - bird_height:  # within the gap exactly
-            if bird_centre < gap_y and bird_v >= 0:
+        elif region == Observation.GAP:  # within the gap exactly
+            if obs.bird_y < obs.gap_y and obs.bird_v >= 0:
                 reward += 10
-            if bird_centre > gap_y and bird_v <= 0:
+            if obs.bird_y > obs.gap_y and obs.bird_v <= 0:
                 reward += 10
             reward += 20
-        elif bird_centre < gap_down + bird_height:  # bird lower than the gap
-            pipe_bird_distance_x = gap_x - self.bird.right
-            pipe_bird_distance_y = gap_down - bird_centre
-            if pipe_bird_distance_y < pipe_bird_distance_x:  # scope within 45deg lower than the gap
-                if bird_v <= 0:
+        elif region == Observation.BELOW:  # bird lower than the gap
+            if obs.dy < obs.dx:  # scope within 45deg lower than the gap
+                if obs.bird_v <= 0:
                     reward -= 10
                 else:
                     reward += 10
             else:
                 reward -= 10
-        elif bird_centre > gap_top - bird_height:  # bird higher than the gap
-            pipe_bird_distance_x = gap_x - self.bird.right
-            pipe_bird_distance_y = bird_centre - gap_top
-            if pipe_bird_distance_y < pipe_bird_distance_x:  # scope within 45deg higher than the gap
-                if bird_v > 0:
+        else:  # bird higher than the gap
+            if obs.dy < obs.dx:  # scope within 45deg higher than the gap
+                if obs.bird_v > 0:
                     reward -= 10
                 else:
                     reward += 10
@@ -566,32 +484,30 @@ class FlappyBirdGame:
 
         return reward
 
-    def agent_decide(self, state):
-        action = self.agent.take_action(state, EXPLORATION)
-        if action == "jump":
+    def agent_decide(self, state_index):
+        if self.agent.act(state_index, EXPLORATION):  # "jump"
             if self.STATE_INDEX == 1:  # state is MAIN GAME, hence make the self.bird jump.
-                if DISPLAYING:
-                    self.SOUNDS["jump"].play()
+                self.play("jump")
                 self.bird.velocity = self.JUMP_VELOCITY  # make self.bird go up
 
     # helpful methods ##############################################################
     def save_data(self, force=False):
-        print(f"Episode: {self.agent.num_episodes}, Score: {self.SCORE},  Highest Score= {self.highest_score}")
-        self.csv_episodes.append(self.agent.num_episodes)
-        self.csv_score.append(self.SCORE)
-
-        if len(self.csv_episodes) == 500 or force:
-            # Create a DataFrame with the episode and score data
-            data = pd.DataFrame({"episode": self.csv_episodes, "score": self.csv_score})
-            # Append the data to the CSV file
-            data.to_csv(csv_file, mode="a", index=False, header=False)
-            self.csv_episodes.clear()
-            self.csv_score.clear()
+        self.progress.episode(self.agent, self.SCORE, self.episode_frames)
+        self.metrics.append(self.agent.num_episodes, self.SCORE, self.episode_frames, time.time())
+        if self.checkpoints and (force or self.agent.num_episodes % CHECKPOINT_PERIOD == 0):
+            self.agent.save_checkpoint(self.checkpoints, self.io)
+        if force:
+            self.progress.report(self.agent)
+            if self.checkpoints:
+                self.q_table.flush()
+            self.metrics.flush()
+            self.io.flush()  # everything is on disk before plot() reads the log
 
     def reset(self):
         self.save_data()
-        self.pipes = [Pipe(self.TEXTURES["pipe"])]
-        self.next_pipe = self.pipes[0]
+        self.episode_frames = 0
+        self.pipes.clear()
+        self.next_pipe = self.pipes.spawn()
         self.bird.reset()
 
         # update the highest score
@@ -603,9 +519,21 @@ class FlappyBirdGame:
 
     # keyboard handler ################################################################
     def keyboard(self, key, a, b):
-        if key == b"q":
+        # speed: '+' doubles it, '-' halves it, '1' back to normal, '0' toggles the unrendered max speed
+        if key in (b"+", b"=", b"-", b"1", b"0"):
+            if key == b"0":
+                self.max_speed = not self.max_speed
+            elif key == b"1":
+                self.speed, self.max_speed = 1, False
+            else:
+                self.speed = min(max(1, self.speed * 2 if key != b"-" else self.speed // 2), MAX_SPEED)
+                self.max_speed = False
+            glutSetWindowTitle(b"Flappy Bird (max speed)" if self.max_speed else f"Flappy Bird x{self.speed}".encode())
+        elif key == b"q":
+            if self.timer:
+                print(self.timer.report(self.timer.write(self.cur_path + "/frame_times.json")))
             if LEARNING:
-                self.agent.save_q_table()
+                self.agent.save_q_table(self.io)
             self.save_data(True)
             self.is_window_open = False
             glutDestroyWindow(self.window)
@@ -0,0 +1,206 @@
+"""
+Texture atlas: all the sprites of assets/sprites packed into one GL texture.
+
+A sprite is then drawn with its region of the atlas, (u0, v0, u1, v1) in texture coordinates,
+so the whole frame is drawn with one bound texture (see classes.SpriteBatch).
+
+The packed atlas and its mipmaps are cached in assets/atlas.cache, keyed by a hash of the sprite files:
+later launches map the cache and upload it without decoding a PNG.
+
+usage:  python atlas.py   -> (re)builds the cache
+"""
+import json
+import time
+import hashlib
+from pathlib import Path
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GLU import *
+from pygame import image
+
+PADDING = 8  # pixels around every sprite (its edges repeated): no bleeding down to mipmap level 3
+MAX_MIPMAP_LEVEL = 3
+MAX_SPRITE_SIZE = 1024  # bigger sprites (start.png, res.png) are scaled down when they are packed
+CACHE_MAGIC = b'FLAPATL1'
+CACHE_ALIGN = 64  # the mipmap levels start at multiples of it in the cache file
+
+
+def load_sprites(directory):
+    """{file name without .png: RGBA array (height, width, 4), first row at the top}"""
+    sprites = {}
+    for path in sorted(Path(directory).glob("*.png")):
+        img = image.load(str(path))
+        sprites[path.stem] = np.frombuffer(image.tostring(img, "RGBA", False), dtype=np.uint8).reshape(
+            img.get_height(), img.get_width(), 4)
+    return sprites
+
+
+def shrink(pixels, max_size=MAX_SPRITE_SIZE):
+    """box filter by the smallest integer factor that brings the sprite under max_size"""
+    factor = -(-max(pixels.shape[:2]) // max_size)
+    if factor == 1:
+        return pixels
+    h, w = (-(-pixels.shape[0] // factor) * factor, -(-pixels.shape[1] // factor) * factor)
+    pixels = np.pad(pixels, ((0, h - pixels.shape[0]), (0, w - pixels.shape[1]), (0, 0)), mode="edge")
+    blocks = pixels.reshape(h // factor, factor, w // factor, factor, 4).astype(np.float32)
+    return blocks.mean(axis=(1, 3)).round().astype(np.uint8)
+
+
+def next_power_of_2(n):
+    return 1 << (int(n) - 1).bit_length()
+
+
+def pack(sprites, padding=PADDING):
+    """
+    shelf packing, the tallest sprites first, into a power of 2 sized atlas.
+    returns the atlas (first row at the top) and {name: (x, y, width, height)} in pixels.
+    """
+    sprites = {name: shrink(pixels) for name, pixels in sprites.items()}
+    area = sum((p.shape[0] + 2 * padding) * (p.shape[1] + 2 * padding) for p in sprites.values())
+    width = next_power_of_2(max(max(p.shape[1] for p in sprites.values()) + 2 * padding, area ** 0.5))
+
+    rects = {}
+    x = y = shelf_height = 0
+    for name in sorted(sprites, key=lambda n: -sprites[n].shape[0]):
+        h, w = sprites[name].shape[:2]
+        if x + w + 2 * padding > width:  # start a new shelf
+            x, y, shelf_height = 0, y + shelf_height, 0
+        rects[name] = (x + padding, y + padding, w, h)
+        x += w + 2 * padding
+        shelf_height = max(shelf_height, h + 2 * padding)
+
+    atlas = np.zeros((next_power_of_2(y + shelf_height), width, 4), dtype=np.uint8)
+    for name, (x, y, w, h) in rects.items():
+        atlas[y - padding:y + h + padding, x - padding:x + w + padding] = np.pad(
+            sprites[name], ((padding, padding), (padding, padding), (0, 0)), mode="edge")
+    return atlas, rects
+
+
+def uv_table(rects, shape):
+    """
+    {name: (u0, v0, u1, v1)} of the rects once the atlas is uploaded upside down
+    (GL's first row is the bottom one, as image.tostring(img, "RGBA", True) gives it).
+    """
+    height, width = shape[:2]
+    return {name: (x / width, (height - y - h) / height, (x + w) / width, (height - y) / height)
+            for name, (x, y, w, h) in rects.items()}
+
+
+def flipped(region):
+    """the region upside down"""
+    u0, v0, u1, v1 = region
+    return u0, v1, u1, v0
+
+
+def mipmaps(atlas, levels=MAX_MIPMAP_LEVEL):
+    """[atlas, atlas / 2, ...]: every level is the 2x2 box filter of the previous one"""
+    chain = [atlas]
+    for _ in range(levels):
+        h, w = chain[-1].shape[0] // 2, chain[-1].shape[1] // 2
+        blocks = chain[-1].reshape(h, 2, w, 2, 4).astype(np.uint16)
+        chain.append(((blocks.sum(axis=(1, 3)) + 2) // 4).astype(np.uint8))
+    return chain
+
+
+def sprites_key(directory):
+    """hash of the sprite files and of the packing parameters"""
+    digest = hashlib.sha256(repr((PADDING, MAX_SPRITE_SIZE, MAX_MIPMAP_LEVEL)).encode())
+    for path in sorted(Path(directory).glob("*.png")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def write_cache(path, key, chain, rects):
+    """
+    magic, header length (uint32), JSON header (key, rects, shape and offset of every level),
+    then the levels (first row of the atlas at the bottom, ready to upload).
+    """
+    shapes = [level.shape for level in chain]
+    offsets, offset = [], 0
+    for level in chain:
+        offsets.append(offset)
+        offset += -(-level.nbytes // CACHE_ALIGN) * CACHE_ALIGN
+    header = json.dumps({"key": key, "rects": rects, "shapes": shapes, "offsets": offsets}).encode()
+    start = -(-(len(CACHE_MAGIC) + 4 + len(header)) // CACHE_ALIGN) * CACHE_ALIGN
+
+    tmp = Path(str(path) + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(CACHE_MAGIC + len(header).to_bytes(4, "little") + header)
+        for level, level_offset in zip(chain, offsets):
+            f.seek(start + level_offset)
+            f.write(np.ascontiguousarray(level[::-1]).tobytes())
+    tmp.replace(path)
+
+
+def read_cache(path, key):
+    """(mapped levels, rects) if the cache at "path" was built from the same sprites, otherwise None"""
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                return None
+            size = int.from_bytes(f.read(4), "little")
+            header = json.loads(f.read(size))
+        if header["key"] != key:
+            return None
+        start = -(-(len(CACHE_MAGIC) + 4 + size) // CACHE_ALIGN) * CACHE_ALIGN
+        # a short or corrupt file fails here (the levels must fit in it): it's rebuilt
+        chain = [np.memmap(path, dtype=np.uint8, mode="r", offset=start + offset, shape=tuple(shape))
+                 for shape, offset in zip(header["shapes"], header["offsets"])]
+        rects = {name: tuple(rect) for name, rect in header["rects"].items()}
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+    return chain, rects
+
+
+def build_cache(directory, path):
+    """decode, pack and mipmap the sprites of "directory" into the cache at "path", returns read_cache()"""
+    key = sprites_key(directory)
+    atlas, rects = pack(load_sprites(directory))
+    write_cache(path, key, mipmaps(atlas), rects)
+    return read_cache(path, key)
+
+
+def init_atlas(directory):
+    """
+    upload the atlas of the sprites of "directory" (from the cache when it's up to date),
+    returns the GL texture and the regions of the game's sprites (named as FlappyBirdGame.TEXTURES).
+    """
+    cache = Path(directory).parent / "atlas.cache"
+    chain, rects = read_cache(cache, sprites_key(directory)) or build_cache(directory, cache)
+    uv = uv_table(rects, chain[0].shape)
+
+    tex = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, tex)
+    glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+    glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, MAX_MIPMAP_LEVEL)
+    glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+    glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+    for level, pixels in enumerate(chain):  # mipmaps from the cache, nothing is computed here
+        glTexImage2D(GL_TEXTURE_2D, level, GL_RGBA, pixels.shape[1], pixels.shape[0], 0,
+                     GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+
+    regions = {
+        "pipe": [uv["pipe-green"], flipped(uv["pipe-green"])],  # lower pipe & upper pipe "image is reflected"
+        "bird": [uv["up"], uv["mid"], uv["down"]],
+        "BackG": uv["background-day"],
+        "numbers": {f'{i}': uv[f'{i}'] for i in range(10)},
+        "base": uv["base"],
+        "msg": uv["message"],
+        "game over": uv["gameover"],
+        "start": uv["start"],
+        "restart": uv["res"],
+    }
+    return tex, regions
+
+
+if __name__ == "__main__":
+    sprites = Path(__file__).parent / "assets" / "sprites"
+    start = time.perf_counter()
+    chain, rects = build_cache(sprites, sprites.parent / "atlas.cache")
+    print(f"{len(rects)} sprites packed into {chain[0].shape[1]}x{chain[0].shape[0]} "
+          f"in {time.perf_counter() - start:.3f}s, saved in {sprites.parent / 'atlas.cache'}")
+    start = time.perf_counter()
+    read_cache(sprites.parent / "atlas.cache", sprites_key(sprites))
+    print(f"cache check and mapping: {(time.perf_counter() - start) * 1e3:.2f}ms")
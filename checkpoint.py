@@ -0,0 +1,94 @@
+"""
+Checkpoints of the Q-table.
+
+The live table is an np.memmap of "<directory>/q_table.live.npy": every update goes to the OS
+page cache, so a crash of the process loses nothing and a restart maps it again instantly.
+Every few episodes snapshot() writes a versioned copy with its metadata (episode, hyper parameters,
+CRC32 checksum); they are used when the live file is lost, e.g. after a machine crash.
+"""
+import os
+import json
+import time
+import glob
+import shutil
+import zlib
+import numpy as np
+from numpy.lib.format import open_memmap
+
+KEEP_SNAPSHOTS = 5  # older snapshots are deleted
+
+
+class CheckpointStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.live_path = os.path.join(directory, "q_table.live.npy")
+        os.makedirs(directory, exist_ok=True)
+
+    def open(self, shape, initial=None):
+        """
+        the live Q-table, from (first found): the live file, the latest valid snapshot,
+        the "initial" .npy file, or zeros.
+        """
+        if not os.path.exists(self.live_path):
+            latest = self.latest()
+            source = latest["table"] if latest else initial
+            if source is not None and os.path.exists(source):
+                shutil.copyfile(source, self.live_path + ".tmp")
+                os.replace(self.live_path + ".tmp", self.live_path)
+            else:
+                open_memmap(self.live_path, mode="w+", dtype=np.float64, shape=shape).flush()
+        table = open_memmap(self.live_path, mode="r+")
+        if table.shape != tuple(shape):
+            raise ValueError(f"{self.live_path} has shape {table.shape}, expected {tuple(shape)}")
+        return table
+
+    def snapshot(self, table, episode, **hyper_parameters):
+        """write a versioned copy of the table and its metadata, returns the metadata"""
+        data = np.array(table)  # copy once: the table keeps changing while it's written
+        name = os.path.join(self.directory, f"q_table.{episode:010d}")
+        meta = {
+            "episode": int(episode),
+            "time": time.time(),
+            "shape": list(data.shape),
+            "checksum": zlib.crc32(data.tobytes()),
+            "table": name + ".npy",
+            **hyper_parameters,
+        }
+        np.save(name + ".tmp.npy", data)
+        os.replace(name + ".tmp.npy", name + ".npy")
+        # the metadata is written last: a snapshot without it is ignored
+        with open(name + ".json.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(name + ".json.tmp", name + ".json")
+        self.prune()
+        return meta
+
+    def snapshots(self):
+        """metadata of all the snapshots, the newest first"""
+        metas = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "q_table.*.json")), reverse=True):
+            with open(path) as f:
+                metas.append(json.load(f))
+        return metas
+
+    def last_episode(self):
+        """episode of the newest snapshot, valid or not (0 if there's none)"""
+        metas = self.snapshots()
+        return metas[0]["episode"] if metas else 0
+
+    def latest(self):
+        """metadata of the newest snapshot whose table matches its checksum (None if there's none)"""
+        for meta in self.snapshots():
+            try:
+                data = np.load(meta["table"])
+            except (OSError, ValueError, EOFError):
+                continue
+            if zlib.crc32(data.tobytes()) == meta["checksum"]:
+                return meta
+        return None
+
+    def prune(self):
+        for meta in self.snapshots()[KEEP_SNAPSHOTS:]:
+            for path in (meta["table"], meta["table"][:-len(".npy")] + ".json"):
+                if os.path.exists(path):
+                    os.remove(path)
@@ -2,6 +2,9 @@ from OpenGL.GL import *
 from OpenGL.GLU import *
 from OpenGL.GLUT import *
 
+import ctypes
+import numpy as np
+from math import cos, sin, radians
 from random import randint
 from itertools import cycle
 
@@ -9,55 +12,175 @@ from itertools import cycle
 SCREENWIDTH = 600
 SCREENHEIGHT = 720
 BASEY = SCREENHEIGHT * 0.2
+GAP_RANGE = (int(BASEY) + 206, SCREENHEIGHT - 220)  # lowest and highest gap height
 ###################################
 
 
 def random_gap():
-    return randint(int(BASEY) + 206, SCREENHEIGHT - 220)
+    return randint(*GAP_RANGE)
 
 
-def draw_rectangle_with_tex(left, right, bottom, top, tex, z=0):
-    glPushMatrix()
-    glBindTexture(GL_TEXTURE_2D, tex)
+class SpriteBatch:
+    """
+    collects the textured quads of a frame in one NumPy vertex array and draws them
+    with one upload (a VBO), one bound texture (the atlas, see atlas.py) and one glDrawArrays,
+    instead of immediate mode calls per vertex.
+    quads are drawn from the farthest (smallest z) to the nearest so the transparent parts blend correctly.
+    """
+    MAX_QUADS = 64
+    VERTEX_SIZE = 5  # x, y, z, u, v
 
-    glBegin(GL_QUADS)
-    glTexCoord(0, 0)
-    glVertex(left, bottom, z)
-    glTexCoord(0, 1)
-    glVertex(left, top, z)
-    glTexCoord(1, 1)
-    glVertex(right, top, z)
-    glTexCoord(1, 0)
-    glVertex(right, bottom, z)
-    glEnd()
+    def __init__(self, max_quads=MAX_QUADS):
+        self.vertices = np.zeros((max_quads, 4, self.VERTEX_SIZE), dtype=np.float32)
+        self.depths = [0.0] * max_quads
+        self.count = 0
+        self.texture = None  # the atlas
+        self.vbo = None  # created on the first draw, once the GL context exists
 
-    glPopMatrix()
+    def begin(self):
+        self.count = 0
+
+    def add(self, left, right, bottom, top, region, z=0, angle=0):
+        """
+        a quad showing the region (u0, v0, u1, v1) of the atlas, rotated by "angle" degrees around its centre.
+        """
+        if self.count == len(self.depths):
+            self.grow()
+        if angle:
+            cx, cy = (left + right) / 2, (bottom + top) / 2
+            c, s = cos(radians(angle)), sin(radians(angle))
+            corners = [(x - cx, y - cy) for x, y in ((left, bottom), (left, top), (right, top), (right, bottom))]
+            (x0, y0), (x1, y1), (x2, y2), (x3, y3) = [(cx + c * x - s * y, cy + s * x + c * y) for x, y in corners]
+        else:
+            x0, y0, x1, y1, x2, y2, x3, y3 = left, bottom, left, top, right, top, right, bottom
+        u0, v0, u1, v1 = region
+        self.vertices[self.count] = ((x0, y0, z, u0, v0), (x1, y1, z, u0, v1), (x2, y2, z, u1, v1), (x3, y3, z, u1, v0))
+        self.depths[self.count] = z
+        self.count += 1
+
+    def grow(self):
+        self.vertices = np.concatenate([self.vertices, np.zeros_like(self.vertices)])
+        self.depths += [0.0] * len(self.depths)
+
+    def end(self):
+        """draw every quad added since begin()"""
+        n = self.count
+        if n == 0:
+            return
+        vertices = self.vertices[sorted(range(n), key=self.depths.__getitem__)]
+        if self.vbo is None:
+            self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STREAM_DRAW)
+        stride = self.VERTEX_SIZE * vertices.itemsize
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(3, GL_FLOAT, stride, ctypes.c_void_p(0))
+        glTexCoordPointer(2, GL_FLOAT, stride, ctypes.c_void_p(3 * vertices.itemsize))
+
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glDrawArrays(GL_QUADS, 0, 4 * n)
+
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
 
 
 class Pipe:
-    def __init__(self, tex):
+    __slots__ = ("gap_size", "width", "gap_y", "left", "right", "upper_y", "lower_y", "count", "tex", "rng")
+
+    def __init__(self, tex, rng=None, spawn=True):
         self.gap_size = 150
         self.width = 70
-        self.gap_y = random_gap()
+        self.tex = tex  # It's alist contains two atlas regions: tex[0] for lower pipe & tex[1] for upper pipe.
+        self.rng = rng  # the game's GameRNG (see game_rng.py), None: the random module
+        if spawn:  # otherwise it's off the screen, without a gap, until respawn()
+            self.respawn()
+
+    def respawn(self):
+        # a new pipe at the right of the screen, with a new gap
+        self.gap_y = self.rng.gap() if self.rng is not None else random_gap()
         self.left = SCREENWIDTH
         self.right = self.left + self.width
         self.upper_y = self.gap_y + self.gap_size * 0.5
         self.lower_y = self.gap_y - self.gap_size * 0.5
         self.count = False  # flag: if the bird has already passed it or not
-        self.tex = tex  # It's alist contains two textures: tex[0] for lower pipe & tex[1] for upper pipe.
 
-    def draw(self):
+    def draw(self, batch):
         # Lower pipe
-        draw_rectangle_with_tex(self.left, self.right, -300, self.lower_y, self.tex[0])
+        batch.add(self.left, self.right, -300, self.lower_y, self.tex[0])
         # Upper pipe
-        draw_rectangle_with_tex(self.left, self.right, self.upper_y, SCREENHEIGHT + 400, self.tex[1])
+        batch.add(self.left, self.right, self.upper_y, SCREENHEIGHT + 400, self.tex[1])
 
     def move(self, shift):
         self.left += shift
         self.right += shift
 
 
+class PipeRing:
+    """
+    the pipes on the screen, the oldest first, kept in a fixed ring of Pipe objects:
+    a pipe that leaves the screen is the one spawn() brings back at the right, nothing is allocated.
+    indexing (negative too), len(), iteration and index() work as with the list it replaces.
+    make_pipe() builds a pipe with spawn=False: the pooled pipes draw their gaps when they're spawned,
+    so the gaps of a seeded game don't depend on the capacity.
+    """
+    __slots__ = ("ring", "start", "size", "make_pipe")
+
+    def __init__(self, make_pipe, capacity=4):
+        self.make_pipe = make_pipe
+        self.ring = [make_pipe() for _ in range(capacity)]
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError("pipe index out of range")
+        return self.ring[(self.start + i) % len(self.ring)]
+
+    def __iter__(self):
+        ring, n = self.ring, len(self.ring)
+        for i in range(self.start, self.start + self.size):
+            yield ring[i % n]
+
+    def index(self, pipe):
+        for i in range(self.size):
+            if self[i] is pipe:
+                return i
+        raise ValueError("pipe not in the ring")
+
+    def spawn(self):
+        """a pipe at the right of the screen, added last"""
+        if self.size == len(self.ring):  # never the case with the game's distance between pipes
+            self.ring = self.ring[self.start:] + self.ring[:self.start] + [self.make_pipe()]
+            self.start = 0
+        pipe = self.ring[(self.start + self.size) % len(self.ring)]
+        pipe.respawn()
+        self.size += 1
+        return pipe
+
+    def popleft(self):
+        """remove the oldest pipe, it stays in the ring for a later spawn()"""
+        pipe = self[0]
+        self.start = (self.start + 1) % len(self.ring)
+        self.size -= 1
+        return pipe
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+
+
 class Bird:
+    __slots__ = ("height", "width", "right", "left", "bottom", "top", "angle",
+                 "fly_speed", "velocity", "gravity", "i_velocity", "angular_s", "i_angular_s", "swap",
+                 "tex", "tex_sequence", "tex_index", "tex_loop")
+
     def __init__(self, tex, gravity=-0.2, angular_s=0.5):
         # shape attributes
         self.height = 40
@@ -77,21 +200,13 @@ class Bird:
         self.i_angular_s = self.angular_s
         # animation Attributes
         self.swap = True
-        self.tex = tex  # It's alist contains 3 textures for (3 states of the bird)
+        self.tex = tex  # It's alist contains 3 atlas regions for (3 states of the bird)
         self.tex_sequence = cycle([0, 1, 2, 1])   # sequence in which we want textures flow.
         self.tex_index = 0  # pointer to the current texture.
         self.tex_loop = 0   # each time the bird is drawn, It's increased by one. "help in controlling the speed of wings".
 
-    def draw(self):
-        glPushMatrix()
-        glLoadIdentity()
-
-        glTranslate((self.right + self.left) / 2, (self.bottom + self.top) / 2, 0)
-        glRotate(self.angle, 0, 0, 1)
-        glTranslate(-(self.right + self.left) / 2, -(self.bottom + self.top) / 2, 0)
-        draw_rectangle_with_tex(self.left, self.right, self.bottom, self.top, 
-                                self.tex[self.tex_index], 0.8)
-        glPopMatrix()
+    def draw(self, batch):
+        batch.add(self.left, self.right, self.bottom, self.top, self.tex[self.tex_index], 0.8, angle=self.angle)
 
         if self.swap:
             self.tex_loop += 1
@@ -145,6 +260,8 @@ class Bird:
 
 
 class Base:
+    __slots__ = ("tex", "z", "width", "right", "left", "top", "bottom")
+
     def __init__(self, tex, z=0.1):
         self.tex = tex
         self.z = z
@@ -154,26 +271,57 @@ class Base:
         self.top = BASEY
         self.bottom = 0
     
-    def draw(self):
-        glPushMatrix()
-        glBindTexture(GL_TEXTURE_2D, self.tex)
-
-        glBegin(GL_QUADS)
-        glTexCoord(0, 0)
-        glVertex(self.left, self.bottom, self.z)
-        glTexCoord(0, 1)
-        glVertex(self.left, self.top, self.z)
-        glTexCoord(2, 1)
-        glVertex(self.right, self.top, self.z)
-        glTexCoord(2, 0)
-        glVertex(self.right, self.bottom, self.z)
-        glEnd()
-
-        glPopMatrix()
+    def draw(self, batch):
+        # the texture is repeated twice along the base
+        middle = (self.left + self.right) / 2
+        batch.add(self.left, middle, self.bottom, self.top, self.tex, self.z)
+        batch.add(middle, self.right, self.bottom, self.top, self.tex, self.z)
 
     def move(self, dx):
         if self.right <= SCREENWIDTH + 1:
             self.right = 2 * SCREENWIDTH
         self.right += dx
         self.left = self.right - self.width
-        
\ No newline at end of file
+
+
+class Observation:
+    """
+    what the agent and the reward see of the game at a decision, computed in one pass into this same
+    object (no dict per decision): the bird's centre and velocity, the gap of the pipe it focuses on,
+    and where the bird is relative to that gap.
+    """
+    __slots__ = ("bird_y", "bird_v", "gap_x", "gap_y", "gap_top", "gap_down", "region", "dx", "dy")
+    # regions of the bird
+    SCOPE = 0  # in the middle of the gap (35% of the gap size from its edges)
+    GAP = 1  # within the gap
+    BELOW = 2  # lower than the gap
+    ABOVE = 3  # higher than the gap
+
+    def __init__(self):
+        self.bird_y = self.bird_v = self.gap_x = self.gap_y = self.gap_top = self.gap_down = 0.0
+        self.region = self.GAP
+        self.dx = self.dy = 0.0  # distances from the bird to the gap's corner (BELOW and ABOVE)
+
+    def update(self, bird, pipe):
+        centre = (bird.bottom + bird.top) / 2
+        self.bird_y = centre
+        self.bird_v = bird.velocity
+        self.gap_x = pipe.left + pipe.width * 0.5  # centre of the pipe
+        self.gap_y = pipe.gap_y
+        top = self.gap_top = pipe.upper_y
+        down = self.gap_down = pipe.lower_y
+        quarter = pipe.gap_size * 0.35
+        height = bird.height
+        if down + quarter <= centre <= top - quarter:
+            self.region = self.SCOPE
+        elif down + height <= centre <= top - height:
+            self.region = self.GAP
+        elif centre < down + height:
+            self.region = self.BELOW
+            self.dx = (self.gap_x - pipe.width * 0.5) - bird.right
+            self.dy = down - centre
+        else:
+            self.region = self.ABOVE
+            self.dx = (self.gap_x - pipe.width * 0.5) - bird.right
+            self.dy = centre - top
+        return self
@@ -0,0 +1,96 @@
+"""
+Frame timing of the GL front end: how long each phase of a frame takes.
+
+The timed methods are wrapped on the instance (see wrap), so nothing is measured, and nothing costs,
+while timing is off. Times are exclusive: the time of "learn" called from "update" isn't counted in "update".
+At exit write() saves the percentiles (p50/p95/p99) of every phase and a histogram of the frame times.
+"""
+import json
+import time
+import numpy as np
+
+PHASES = ("update", "decide", "learn", "draw", "swap")
+CAPACITY = 1 << 16  # frames kept (the latest ones)
+HISTOGRAM_BINS = np.append(np.arange(0, 33, 0.5), np.inf)  # frame time bins in ms
+FPS_PERIOD = 1.0  # seconds between two updates of the FPS
+
+
+class FrameTimer:
+    def __init__(self, phases=PHASES, capacity=CAPACITY):
+        self.phases = phases
+        self.samples = np.zeros((capacity, len(phases) + 1), dtype=np.int64)  # ns per phase and the frame total
+        self.count = 0  # frames ended so far
+        self.current = [0] * len(phases)  # ns per phase in the current frame
+        self.nested = 0  # ns spent in timed calls inside the running one
+        self.frame_start = time.perf_counter_ns()
+        self.fps = 0.0
+        self.fps_frames = 0
+        self.fps_start = self.frame_start
+
+    def wrap(self, phase, fn):
+        """fn timed as "phase", e.g. game.update_frame = timer.wrap("update", game.update_frame)"""
+        i = self.phases.index(phase)
+        current = self.current
+
+        def timed(*args, **kwargs):
+            outer, self.nested = self.nested, 0
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                current[i] += elapsed - self.nested
+                self.nested = outer + elapsed
+        return timed
+
+    def end_frame(self):
+        now = time.perf_counter_ns()
+        row = self.samples[self.count % len(self.samples)]
+        row[:-1] = self.current
+        row[-1] = now - self.frame_start
+        self.count += 1
+        self.current[:] = [0] * len(self.current)
+        self.frame_start = now
+
+        self.fps_frames += 1
+        if now - self.fps_start >= FPS_PERIOD * 1e9:
+            self.fps = self.fps_frames * 1e9 / (now - self.fps_start)
+            self.fps_frames, self.fps_start = 0, now
+
+    def recent(self, n=30):
+        """mean busy time (sum of the phases) of the last n frames in microseconds"""
+        n = min(n, self.count, len(self.samples))
+        if not n:
+            return 0.0
+        rows = (self.count - 1 - np.arange(n)) % len(self.samples)
+        return self.samples[rows, :-1].sum(axis=1).mean() / 1e3
+
+    def summary(self):
+        """
+        {phase or "frame": {"mean", "p50", "p95", "p99"} in ms} and the histogram of the frame times
+        ("frame" is the time between the ends of two frames, waiting for the next timer tick included).
+        """
+        samples = self.samples[:min(self.count, len(self.samples))] / 1e6
+        stats = {}
+        for j, name in enumerate(self.phases + ("frame",)):
+            column = samples[:, j]
+            p50, p95, p99 = np.percentile(column, (50, 95, 99)) if len(column) else (0.0, 0.0, 0.0)
+            stats[name] = {"mean": float(column.mean()) if len(column) else 0.0,
+                           "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+        counts, _ = np.histogram(samples[:, -1], HISTOGRAM_BINS)
+        return {"frames": len(samples), "fps": self.fps, "ms": stats,
+                "histogram": {"bins_ms": HISTOGRAM_BINS[:-1].tolist(), "counts": counts.tolist()}}
+
+    def write(self, path):
+        summary = self.summary()
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=1)
+        return summary
+
+    def report(self, summary=None):
+        summary = summary or self.summary()
+        lines = [f"frame times over {summary['frames']} frames (ms):"]
+        for name, s in summary["ms"].items():
+            lines.append(f"  {name:<7} mean {s['mean']:7.3f}  p50 {s['p50']:7.3f}  "
+                         f"p95 {s['p95']:7.3f}  p99 {s['p99']:7.3f}")
+        return "\n".join(lines)
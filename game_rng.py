@@ -0,0 +1,55 @@
+"""
+Random draws of one game from its own seeded generators, so a run can be repeated exactly.
+
+The pipe gaps and the uniform draws of the agent (exploration, ties) are generated by NumPy in blocks
+and handed out one by one, instead of a call to the global random module per pipe or per decision.
+Gaps and uniform draws come from separate streams of the seed: the pipes of a run don't depend
+on how many times the agent explored. GameRNG has the methods of the random module that the agents use,
+so it's passed to them in its place.
+"""
+import numpy as np
+
+BLOCK = 4096  # draws generated at once
+
+
+class GameRNG:
+    def __init__(self, seed=None, gap_range=(0, 1)):
+        """
+        seed: int, tuple of ints (e.g. (seed, worker)) or None for a fresh one (kept in self.seed).
+        gap_range: (lowest, highest) gap height, both included.
+        """
+        sequence = np.random.SeedSequence(seed)
+        self.seed = sequence.entropy
+        gap_seq, uniform_seq, generator_seq = sequence.spawn(3)
+        self.gap_range = gap_range
+        self.gap_generator = np.random.default_rng(gap_seq)
+        self.uniform_generator = np.random.default_rng(uniform_seq)
+        self.generator = np.random.default_rng(generator_seq)  # for the NumPy draws of the agents
+        self.gaps, self.gap_i = [], 0
+        self.uniforms, self.uniform_i = [], 0
+
+    def gap(self):
+        """the gap height of a new pipe"""
+        if self.gap_i == len(self.gaps):
+            low, high = self.gap_range
+            self.gaps, self.gap_i = self.gap_generator.integers(low, high + 1, BLOCK).tolist(), 0
+        self.gap_i += 1
+        return self.gaps[self.gap_i - 1]
+
+    # the random module's interface ############################
+    def random(self):
+        if self.uniform_i == len(self.uniforms):
+            self.uniforms, self.uniform_i = self.uniform_generator.random(BLOCK).tolist(), 0
+        self.uniform_i += 1
+        return self.uniforms[self.uniform_i - 1]
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+    def randrange(self, start, stop=None):
+        if stop is None:
+            start, stop = 0, start
+        return start + int(self.random() * (stop - start))
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
@@ -1,6 +1,7 @@
 from pathlib import Path
-from pygame import mixer, image
+from pygame import mixer
 from classes import *
+from atlas import init_atlas
 
 
 class FlappyBirdGame:
@@ -21,18 +22,14 @@ class FlappyBirdGame:
         self.JUMP_VELOCITY = 5
         self.GRAVITY = -0.22
         ###################################################
-        self.pipes = []  # contains all displayed pipes on the screen
+        self.pipes = None  # contains all displayed pipes on the screen (a PipeRing, the pipes are reused)
         self.bird = None
         self.base = None
         self.window = None
         self.is_window_open = True
         ###########################################
-        self.TEXTURES = {}  # at the start of game, all textures will be created once time and saved in it.
+        self.TEXTURES = {}  # at the start of game, the atlas regions of all the sprites are saved in it.
         self.SOUNDS = {}
-        self.PLAYERS_LIST = (
-            self.cur_path + '/assets/sprites/up.png',
-            self.cur_path + '/assets/sprites/mid.png',
-            self.cur_path + '/assets/sprites/down.png')
 
         self.run()
 
@@ -58,6 +55,7 @@ class FlappyBirdGame:
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
+        self.batch = SpriteBatch()
         self.init_texture()
         self.init_sounds()
         self.init_objects()
@@ -78,167 +76,12 @@ class FlappyBirdGame:
         self.SOUNDS["point"] = mixer.Sound(self.cur_path + "/assets/audio/point" + SOUNDEXT)
 
     def init_texture(self):
-        # Initialize textures
-        # ################### Pipe Textures ###########################################################
-        img_pipe_load = image.load(self.cur_path + '/assets/sprites/pipe-green.png')
-        width = img_pipe_load.get_width()
-        height = img_pipe_load.get_height()
-        img_pipe = [
-            image.tostring(img_pipe_load, "RGBA", True),  # lower image
-            image.tostring(img_pipe_load, "RGBA", False)]  # upper image "image is reflected".
-
-        # creating 2 textures for pipes
-        tex = glGenTextures(2)
-        # adjust texture and uploading its image
-        for i in [0, 1]:
-            glBindTexture(GL_TEXTURE_2D, tex[i])
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-            gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width, height, GL_RGBA, GL_UNSIGNED_BYTE, img_pipe[i])
-
-        self.TEXTURES["pipe"] = tex
-        # ################### Bird Textures ############################################################
-        img_bird_load = [image.load(Address) for Address in self.PLAYERS_LIST]
-        width = [img.get_width() for img in img_bird_load]
-        height = [img.get_height() for img in img_bird_load]
-        img_bird = [image.tostring(img, "RGBA", True) for img in img_bird_load]
-
-        # creating 3 textures for bird
-        tex = glGenTextures(3)
-        # adjust texture and uploading its image
-        for i in [0, 1, 2]:
-            glBindTexture(GL_TEXTURE_2D, tex[i])
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-            gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width[i], height[i], GL_RGBA, GL_UNSIGNED_BYTE, img_bird[i])
-
-        self.TEXTURES["bird"] = tex
-        # ################### Background Texture ############################################################
-        img_backG_load = image.load(self.cur_path + '/assets/sprites/background-day.png')
-        width = img_backG_load.get_width()
-        height = img_backG_load.get_height()
-        img_backG = image.tostring(img_backG_load, "RGBA", True)
-
-        # creating 1 texture for BackG
-        tex = glGenTextures(1)
-        # adjust texture and uploading its image
-        glBindTexture(GL_TEXTURE_2D, tex)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width, height, GL_RGBA, GL_UNSIGNED_BYTE, img_backG)
-
-        self.TEXTURES["BackG"] = tex
-        # ################### numbers Textures ############################################################
-        img_num_load = [image.load(self.cur_path + f'/assets/sprites/{i}.png') for i in range(10)]
-        width = [img.get_width() for img in img_num_load]
-        height = [img.get_height() for img in img_num_load]
-        img_num = [image.tostring(img, "RGBA", True) for img in img_num_load]
-
-        # creating 10 textures for numbers
-        tex = glGenTextures(10)
-        # adjust texture and uploading its image
-        for i in range(10):
-            glBindTexture(GL_TEXTURE_2D, tex[i])
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-            gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width[i], height[i], GL_RGBA, GL_UNSIGNED_BYTE, img_num[i])
-
-        self.TEXTURES["numbers"] = {f'{i}': tex[i] for i in range(10)}
-        # ################### base Texture ############################################################
-        img_base_load = image.load(self.cur_path + '/assets/sprites/base.png')
-        width = img_base_load.get_width()
-        height = img_base_load.get_height()
-        img_base = image.tostring(img_base_load, "RGBA", True)
-
-        # creating 1 texture
-        tex = glGenTextures(1)
-        # adjust texture and uploading its image
-        glBindTexture(GL_TEXTURE_2D, tex)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width, height, GL_RGBA, GL_UNSIGNED_BYTE, img_base)
-
-        self.TEXTURES["base"] = tex
-        # ################### message Texture ############################################################
-        img_msg_load = image.load(self.cur_path + '/assets/sprites/message.png')
-        width = img_msg_load.get_width()
-        height = img_msg_load.get_height()
-        img_msg = image.tostring(img_msg_load, "RGBA", True)
-
-        # creating 1 texture
-        tex = glGenTextures(1)
-        # adjust texture and uploading its image
-        glBindTexture(GL_TEXTURE_2D, tex)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width, height, GL_RGBA, GL_UNSIGNED_BYTE, img_msg)
-        # glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_msg)
-
-        self.TEXTURES["msg"] = tex
-        # ################### game over Texture ############################################################
-        img_gameO_load = image.load(self.cur_path + '/assets/sprites/gameover.png')
-        width = img_gameO_load.get_width()
-        height = img_gameO_load.get_height()
-        img_gameO = image.tostring(img_gameO_load, "RGBA", True)
-
-        # creating 1 texture
-        tex = glGenTextures(1)
-        # adjust texture and uploading its image
-        glBindTexture(GL_TEXTURE_2D, tex)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width, height, GL_RGBA, GL_UNSIGNED_BYTE, img_gameO)
-
-        self.TEXTURES["game over"] = tex
-        # ################### start Texture ############################################################
-        img_msg_load = image.load(self.cur_path + '/assets/sprites/start.png')
-        width = img_msg_load.get_width()
-        height = img_msg_load.get_height()
-        img_msg = image.tostring(img_msg_load, "RGBA", True)
-        # creating 1 texture
-        tex = glGenTextures(1)
-        # adjust texture and uploading its image
-        glBindTexture(GL_TEXTURE_2D, tex)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width, height, GL_RGBA, GL_UNSIGNED_BYTE, img_msg)
-
-        self.TEXTURES["start"] = tex
-        # ################### restart Texture ############################################################
-        img_msg_load = image.load(self.cur_path + '/assets/sprites/res.png')
-        width = img_msg_load.get_width()
-        height = img_msg_load.get_height()
-        img_msg = image.tostring(img_msg_load, "RGBA", True)
-        # creating 1 texture
-        tex = glGenTextures(1)
-        # adjust texture and uploading its image
-        glBindTexture(GL_TEXTURE_2D, tex)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        gluBuild2DMipmaps(GL_TEXTURE_2D, 4, width, height, GL_RGBA, GL_UNSIGNED_BYTE, img_msg)
-
-        self.TEXTURES["restart"] = tex
+        # all the sprites are packed into one texture, self.TEXTURES keeps their regions in it
+        self.batch.texture, self.TEXTURES = init_atlas(self.cur_path + '/assets/sprites')
 
     def init_objects(self):
-        self.pipes.append(Pipe(self.TEXTURES["pipe"]))
+        self.pipes = PipeRing(lambda: Pipe(self.TEXTURES["pipe"], spawn=False))
+        self.pipes.spawn()
         self.bird = Bird(self.TEXTURES["bird"], self.GRAVITY, self.ANGULAR_SPEED)
         self.base = Base(self.TEXTURES["base"], 0.1)
 
@@ -252,8 +95,9 @@ class FlappyBirdGame:
     def display(self):
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         glLoadIdentity()
+        self.batch.begin()  # the quads of this frame are drawn at once by batch.end()
         self.set_background()
-        self.base.draw()
+        self.base.draw(self.batch)
 
         if self.GAME_STATES[self.STATE_INDEX] == "welcome":
             self.welcome()
@@ -262,6 +106,7 @@ class FlappyBirdGame:
         elif self.GAME_STATES[self.STATE_INDEX] == "over":
             self.game_over()
 
+        self.batch.end()
         glutSwapBuffers()
 
     def update_frame(self):
@@ -285,18 +130,18 @@ class FlappyBirdGame:
     # ############################### Render game states ########################################################
     def welcome(self):
         self.show_welcome()
-        self.bird.draw()
+        self.bird.draw(self.batch)
 
     def main_game(self):
         for pipe in self.pipes:
-            pipe.draw()
+            pipe.draw(self.batch)
         self.show_score(str(self.SCORE))
-        self.bird.draw()
+        self.bird.draw(self.batch)
 
     def game_over(self):
         for pipe in self.pipes:
-            pipe.draw()
-        self.bird.draw()
+            pipe.draw(self.batch)
+        self.bird.draw(self.batch)
         self.show_score(str(self.SCORE))
         self.show_game_over()
 
@@ -317,9 +162,9 @@ class FlappyBirdGame:
 
     def update_pipes(self):
         if self.pipes[0].right < 0:
-            self.pipes.pop(0)
+            self.pipes.popleft()
         if self.pipes[-1].left <= self.DISTANCE:
-            self.pipes.append(Pipe(self.TEXTURES["pipe"]))
+            self.pipes.spawn()
 
     def update_score(self):
         pipe = self.pipes[0]
@@ -337,25 +182,22 @@ class FlappyBirdGame:
         width = 40
         height = width * 1.5
 
-        glPushMatrix()
-        glTranslate(-(len(score) / 2 + 1) * width, 0, 0)  # centre the text.
+        left = 0.5 * SCREENWIDTH - len(score) / 2 * width  # centre the text.
         for n in score:
-            glTranslate(width, 0, 0)  # to show numbers beside each other one, not over.
-            draw_rectangle_with_tex(0.5 * SCREENWIDTH, 0.5 * SCREENWIDTH + width,
-                                    0.85 * SCREENHEIGHT, 0.85 * SCREENHEIGHT + height,
-                                    self.TEXTURES["numbers"][n], 0.5)
-        glPopMatrix()
+            self.batch.add(left, left + width, 0.85 * SCREENHEIGHT, 0.85 * SCREENHEIGHT + height,
+                           self.TEXTURES["numbers"][n], 0.5)
+            left += width  # to show numbers beside each other one, not over.
 
     def set_background(self):
-        draw_rectangle_with_tex(0, SCREENWIDTH, 0, SCREENHEIGHT + 5, self.TEXTURES["BackG"], -1)
+        self.batch.add(0, SCREENWIDTH, 0, SCREENHEIGHT + 5, self.TEXTURES["BackG"], -1)
 
     def show_game_over(self):
-        draw_rectangle_with_tex(100, 500, 400, 600, self.TEXTURES["game over"], 0.5)
-        draw_rectangle_with_tex(0, SCREENWIDTH, 0, BASEY + 200, self.TEXTURES["restart"], 0.9)
+        self.batch.add(100, 500, 400, 600, self.TEXTURES["game over"], 0.5)
+        self.batch.add(0, SCREENWIDTH, 0, BASEY + 200, self.TEXTURES["restart"], 0.9)
 
     def show_welcome(self):
-        draw_rectangle_with_tex(50, 550, 420, 720, self.TEXTURES["msg"], 0.5)
-        draw_rectangle_with_tex(0, SCREENWIDTH, 0, BASEY + 200, self.TEXTURES["start"], 0.2)
+        self.batch.add(50, 550, 420, 720, self.TEXTURES["msg"], 0.5)
+        self.batch.add(0, SCREENWIDTH, 0, BASEY + 200, self.TEXTURES["start"], 0.2)
 
     ######################################################################################################
     def keyboard(self, key, a, b):
@@ -371,7 +213,8 @@ class FlappyBirdGame:
                 self.STATE_INDEX = next(self.STATE_SEQUENCE)
 
             elif self.STATE_INDEX == 2:  # state is GAME OVER.
-                self.pipes = [Pipe(self.TEXTURES["pipe"])]
+                self.pipes.clear()
+                self.pipes.spawn()
                 self.bird.reset()
                 self.SCORE = 0
                 self.STATE_INDEX = next(self.STATE_SEQUENCE)
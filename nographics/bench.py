@@ -0,0 +1,207 @@
+"""
+Throughput benchmark of the headless game (main.py) on fixed-seed scenarios:
+    physics   the game engine alone, the bird is kept in the gaps by a simple rule instead of an agent
+    greedy    play with the greedy policy of q_table.npy
+    learning  Q-learning from a table of zeros, with exploration
+    long      greedy play until an episode reaches the score LONG_SCORE (long episodes: a big score, many pipes)
+
+Every scenario is run "repeats" times and the median of each metric is kept: frames/sec, decisions/sec,
+episodes/sec, then (in a second, instrumented run) the microseconds per call of get_reward,
+the state index (the agent's index_observation) and learn (learn_index).
+Nothing is written to the logs or to q_table.npy. Results can be saved as a JSON baseline, and compared to it.
+
+usage:
+    python bench.py [repeats]              -> runs the scenarios and prints the results
+    python bench.py save [repeats]         -> and saves them to bench_baseline.json
+    python bench.py compare [threshold]    -> exits with 1 if a metric is worse than the baseline by more
+                                              than threshold (0.1: 10%)
+"""
+import sys
+import json
+import time
+import platform
+import numpy as np
+import main
+from main import FlappyBirdGame
+from qlearn_agent import *
+
+BENCH_SEED = 2024
+REPEATS = 5
+THRESHOLD = 0.1
+FRAMES = 50000  # frames of a run (physics, greedy, learning)
+LONG_SCORE = 1000  # end of the long scenario
+MAX_LONG_FRAMES = 2000000  # the long scenario stops there anyway
+BASELINE_FILE = cur_path + "/bench_baseline.json"
+
+# scenario: (LEARNING, agent's table: "zeros" or "trained", None for the rule)
+SCENARIOS = {
+    "physics": (False, None),
+    "greedy": (False, "trained"),
+    "learning": (True, "zeros"),
+    "long": (False, "trained"),
+}
+HIGHER_IS_BETTER = {"frames_per_sec", "decisions_per_sec", "episodes_per_sec"}
+
+
+class NullLog:
+    """episodes log of a BenchGame: nothing is read or written"""
+    highest_score = 0
+
+    def append(self, episode, score, frames=0, time=0.0):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class BenchGame(FlappyBirdGame):
+    """FlappyBirdGame stepped by the benchmark: no game loop and no logs, the episodes are only counted"""
+    def __init__(self, q_table, rule=False):
+        self.rule = rule
+        self.scores = []
+        self.decisions = 0
+        super().__init__(q_table)
+
+    def run(self):
+        self.init_objects()
+
+    def open_metrics(self):
+        return NullLog()
+
+    def agent_decide(self, state_index):
+        self.decisions += 1
+        if not self.rule:
+            return super().agent_decide(state_index)
+        # jump when the bird is under the centre of the gap and falling
+        if self.STATE_INDEX == 1 and self.obs.bird_y < self.obs.gap_y and self.obs.bird_v < 0:
+            self.bird.velocity = self.JUMP_VELOCITY
+
+    def save_data(self, force=False, skip=False):
+        if not skip:
+            self.scores.append(self.SCORE)
+
+    def play(self, frames=FRAMES, score=None):
+        """
+        plays "frames" frames, or (score given) until the score is reached, at most MAX_LONG_FRAMES frames.
+        returns the elapsed seconds and the frames played.
+        """
+        start = time.perf_counter()
+        if score is None:
+            for _ in range(frames):
+                self.update_frame()
+                self.counter -= 1
+        else:
+            frames = 0
+            while self.SCORE < score and frames < MAX_LONG_FRAMES:
+                self.update_frame()
+                self.counter -= 1
+                frames += 1
+        return time.perf_counter() - start, frames
+
+
+def new_game(name):
+    learning, table = SCENARIOS[name]
+    main.SEED, main.LEARNING, main.EXPLORATION, main.LIVE_VIEW = BENCH_SEED, learning, learning, False
+    shape = NUM_STATES + (NUM_ACTIONS,)
+    q_table = np.zeros(shape) if table != "trained" else load_q_table(shape).copy()
+    return BenchGame(q_table, rule=table is None)
+
+
+def timed(fn, totals, key):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            totals[key][0] += time.perf_counter_ns() - start
+            totals[key][1] += 1
+    return wrapper
+
+
+def run_once(name):
+    """metrics of one run of the scenario "name" """
+    game = new_game(name)
+    elapsed, frames = game.play(score=LONG_SCORE if name == "long" else None)
+    game.io.close()
+    metrics = {
+        "frames_per_sec": frames / elapsed,
+        "decisions_per_sec": game.decisions / elapsed,
+        "episodes_per_sec": len(game.scores) / elapsed,
+    }
+
+    # the same run again with timers around the hot functions
+    game = new_game(name)
+    totals = {key: [0, 0] for key in ("get_reward_us", "state_index_us", "learn_us")}
+    game.get_reward = timed(game.get_reward, totals, "get_reward_us")
+    game.agent.index_observation = timed(game.agent.index_observation, totals, "state_index_us")
+    if main.LEARNING:
+        game.agent.learn_index = timed(game.agent.learn_index, totals, "learn_us")
+    game.play(score=LONG_SCORE if name == "long" else None)
+    game.io.close()
+    for key, (ns, calls) in totals.items():
+        if calls:
+            metrics[key] = ns / calls / 1e3
+    metrics["mean_score"] = float(np.mean(game.scores + [game.SCORE]))  # the episode in progress too
+    return metrics
+
+
+def run(repeats=REPEATS):
+    results = {}
+    for name in SCENARIOS:
+        runs = [run_once(name) for _ in range(repeats)]
+        results[name] = {key: float(np.median([r[key] for r in runs])) for key in runs[0]}
+        print(f"{name:9s}" + "  ".join(f"{key}: {value:.4g}" for key, value in results[name].items()))
+    return {
+        "seed": BENCH_SEED,
+        "repeats": repeats,
+        "time": time.time(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "scenarios": results,
+    }
+
+
+def save(repeats=REPEATS, path=BASELINE_FILE):
+    results = run(repeats)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"baseline saved in {path}")
+    return results
+
+
+def compare(threshold=THRESHOLD, path=BASELINE_FILE):
+    """runs the scenarios with the baseline's repeats, returns the regressions [(scenario, metric, change)]"""
+    with open(path) as f:
+        baseline = json.load(f)
+    results = run(baseline["repeats"])
+    regressions = []
+    for name, metrics in baseline["scenarios"].items():
+        for key, old in metrics.items():
+            new = results["scenarios"].get(name, {}).get(key)
+            if new is None or key == "mean_score" or not old:
+                continue
+            change = (new - old) / old if key in HIGHER_IS_BETTER else (old - new) / old  # < 0: worse
+            status = "REGRESSION" if change < -threshold else ""
+            print(f"{name:9s}{key:18s} {old:12.4g} -> {new:12.4g}  {change:+7.1%}  {status}")
+            if status:
+                regressions.append((name, key, change))
+        old_score = metrics.get("mean_score")
+        if old_score is not None and results["scenarios"][name]["mean_score"] != old_score:
+            print(f"{name:9s}mean score changed: {old_score} -> {results['scenarios'][name]['mean_score']} "
+                  f"(the game or the agent doesn't play the same episodes)")
+    return regressions
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "save":
+        save(*[int(a) for a in sys.argv[2:]])
+    elif len(sys.argv) > 1 and sys.argv[1] == "compare":
+        regressions = compare(*[float(a) for a in sys.argv[2:]])
+        print(f"{len(regressions)} regression(s)")
+        sys.exit(1 if regressions else 0)
+    else:
+        run(*[int(a) for a in sys.argv[1:]])
@@ -5,18 +5,27 @@ from itertools import cycle
 SCREENWIDTH = 600
 SCREENHEIGHT = 720
 BASEY = SCREENHEIGHT * 0.2
+GAP_RANGE = (int(BASEY) + 206, SCREENHEIGHT - 220)  # lowest and highest gap height
 ###################################
 
 
 def random_gap():
-    return randint(int(BASEY) + 206, SCREENHEIGHT - 220)
+    return randint(*GAP_RANGE)
 
 
 class Pipe:
-    def __init__(self):
+    __slots__ = ("gap_size", "width", "gap_y", "left", "right", "upper_y", "lower_y", "count", "rng")
+
+    def __init__(self, rng=None, spawn=True):
         self.gap_size = 150
         self.width = 70
-        self.gap_y = random_gap()
+        self.rng = rng  # the game's GameRNG (see game_rng.py), None: the random module
+        if spawn:  # otherwise it's off the screen, without a gap, until respawn()
+            self.respawn()
+
+    def respawn(self):
+        # a new pipe at the right of the screen, with a new gap
+        self.gap_y = self.rng.gap() if self.rng is not None else random_gap()
         self.left = SCREENWIDTH
         self.right = self.left + self.width
         self.upper_y = self.gap_y + self.gap_size * 0.5
@@ -28,7 +37,69 @@ class Pipe:
         self.right += shift
 
 
+class PipeRing:
+    """
+    the pipes on the screen, the oldest first, kept in a fixed ring of Pipe objects:
+    a pipe that leaves the screen is the one spawn() brings back at the right, nothing is allocated.
+    indexing (negative too), len(), iteration and index() work as with the list it replaces.
+    make_pipe() builds a pipe with spawn=False: the pooled pipes draw their gaps when they're spawned,
+    so the gaps of a seeded game don't depend on the capacity.
+    """
+    __slots__ = ("ring", "start", "size", "make_pipe")
+
+    def __init__(self, make_pipe, capacity=4):
+        self.make_pipe = make_pipe
+        self.ring = [make_pipe() for _ in range(capacity)]
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError("pipe index out of range")
+        return self.ring[(self.start + i) % len(self.ring)]
+
+    def __iter__(self):
+        ring, n = self.ring, len(self.ring)
+        for i in range(self.start, self.start + self.size):
+            yield ring[i % n]
+
+    def index(self, pipe):
+        for i in range(self.size):
+            if self[i] is pipe:
+                return i
+        raise ValueError("pipe not in the ring")
+
+    def spawn(self):
+        """a pipe at the right of the screen, added last"""
+        if self.size == len(self.ring):  # never the case with the game's distance between pipes
+            self.ring = self.ring[self.start:] + self.ring[:self.start] + [self.make_pipe()]
+            self.start = 0
+        pipe = self.ring[(self.start + self.size) % len(self.ring)]
+        pipe.respawn()
+        self.size += 1
+        return pipe
+
+    def popleft(self):
+        """remove the oldest pipe, it stays in the ring for a later spawn()"""
+        pipe = self[0]
+        self.start = (self.start + 1) % len(self.ring)
+        self.size -= 1
+        return pipe
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+
+
 class Bird:
+    __slots__ = ("height", "width", "right", "left", "bottom", "top", "angle",
+                 "fly_speed", "velocity", "gravity", "i_velocity", "angular_s", "i_angular_s", "swap")
+
     def __init__(self, gravity=-0.2, angular_s=0.5):
         # shape attributes
         self.height = 40
@@ -97,6 +168,8 @@ class Bird:
 
 
 class Base:
+    __slots__ = ("width", "right", "left", "top", "bottom")
+
     def __init__(self):
         self.width = 2 * SCREENWIDTH + 5
         self.right = 2 * SCREENWIDTH
@@ -110,3 +183,45 @@ class Base:
         self.right += dx
         self.left = self.right - self.width
 
+
+class Observation:
+    """
+    what the agent and the reward see of the game at a decision, computed in one pass into this same
+    object (no dict per decision): the bird's centre and velocity, the gap of the pipe it focuses on,
+    and where the bird is relative to that gap.
+    """
+    __slots__ = ("bird_y", "bird_v", "gap_x", "gap_y", "gap_top", "gap_down", "region", "dx", "dy")
+    # regions of the bird
+    SCOPE = 0  # in the middle of the gap (35% of the gap size from its edges)
+    GAP = 1  # within the gap
+    BELOW = 2  # lower than the gap
+    ABOVE = 3  # higher than the gap
+
+    def __init__(self):
+        self.bird_y = self.bird_v = self.gap_x = self.gap_y = self.gap_top = self.gap_down = 0.0
+        self.region = self.GAP
+        self.dx = self.dy = 0.0  # distances from the bird to the gap's corner (BELOW and ABOVE)
+
+    def update(self, bird, pipe):
+        centre = (bird.bottom + bird.top) / 2
+        self.bird_y = centre
+        self.bird_v = bird.velocity
+        self.gap_x = pipe.left + pipe.width * 0.5  # centre of the pipe
+        self.gap_y = pipe.gap_y
+        top = self.gap_top = pipe.upper_y
+        down = self.gap_down = pipe.lower_y
+        quarter = pipe.gap_size * 0.35
+        height = bird.height
+        if down + quarter <= centre <= top - quarter:
+            self.region = self.SCOPE
+        elif down + height <= centre <= top - height:
+            self.region = self.GAP
+        elif centre < down + height:
+            self.region = self.BELOW
+            self.dx = (self.gap_x - pipe.width * 0.5) - bird.right
+            self.dy = down - centre
+        else:
+            self.region = self.ABOVE
+            self.dx = (self.gap_x - pipe.width * 0.5) - bird.right
+            self.dy = centre - top
+        return self
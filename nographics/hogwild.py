@@ -0,0 +1,124 @@
+"""
+Hogwild training: K headless games learn into one Q-table kept in shared memory.
+
+Every worker runs its own FlappyBirdGame and calls learn() on the shared table without locks,
+the coordinator (this process) snapshots the table to q_table.npy every few seconds.
+
+usage:  python hogwild.py [workers] [seconds]
+"""
+import os
+import sys
+import time
+import random
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+import main
+import metrics_log
+from main import FlappyBirdGame
+from qlearn_agent import *
+
+SNAPSHOT_PERIOD = 30  # seconds between two snapshots of the Q-table
+REPORT_PERIOD = 5  # seconds between two throughput reports
+Q_SHAPE = NUM_STATES + (NUM_ACTIONS,)
+
+
+class HogwildGame(FlappyBirdGame):
+    """
+    FlappyBirdGame that learns into a shared table, counts its progress in shared counters
+    and leaves saving to the coordinator.
+    """
+    def __init__(self, q_table, stats, stop):
+        self.stats = stats  # [episodes, frames, highest score] of this worker
+        self.stop = stop
+        self.played_frames = 0  # frames of the finished episodes
+        super().__init__(q_table)
+
+    def frames(self):
+        while not self.stop.is_set():
+            for _ in range(1000):
+                self.update_frame()
+                self.counter -= 1
+            # frames played, not update_frame() calls: with MACRO_STEP a call plays up to frames_per_step frames
+            self.stats[1] = self.played_frames + self.episode_frames
+
+    def save_data(self, force=False, skip=False):
+        self.played_frames += self.episode_frames
+        self.stats[0] += 1
+        if self.SCORE > self.stats[2]:
+            self.stats[2] = self.SCORE
+
+
+def worker(shm_name, stats, stop, index):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        q_table = np.ndarray(Q_SHAPE, dtype=np.float64, buffer=shm.buf)
+        # forked workers inherit the same random state, each one needs its own pipes and exploration.
+        random.seed()
+        if main.SEED is not None:
+            main.SEED = (main.SEED, index)
+        main.LEARNING = True
+        main.EXPLORATION = True
+        HogwildGame(q_table, stats, stop)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shm.close()
+
+
+def save_snapshot(q_table):
+    # write to a temporary file first so a crash never leaves a half written q_table.npy
+    tmp = cur_path + "/q_table.tmp.npy"
+    np.save(tmp, q_table.copy())
+    os.replace(tmp, cur_path + "/q_table.npy")
+
+
+def train(num_workers=os.cpu_count(), duration=None):
+    init_table = load_q_table(Q_SHAPE)
+    shm = shared_memory.SharedMemory(create=True, size=init_table.nbytes)
+    q_table = np.ndarray(Q_SHAPE, dtype=np.float64, buffer=shm.buf)
+    q_table[:] = init_table
+
+    # create the episodes log (or convert the old CSV) once, before the workers open it
+    metrics_log.MetricsLog(log_file, csv_file).close()
+
+    stop = mp.Event()
+    stats = [mp.Array('q', 3, lock=False) for _ in range(num_workers)]
+    workers = [mp.Process(target=worker, args=(shm.name, stats[i], stop, i), daemon=True)
+               for i in range(num_workers)]
+    for p in workers:
+        p.start()
+
+    start = last_report = last_snapshot = time.perf_counter()
+    last_frames = 0
+    try:
+        while duration is None or time.perf_counter() - start < duration:
+            time.sleep(0.5)
+            now = time.perf_counter()
+            if now - last_report >= REPORT_PERIOD:
+                episodes = sum(s[0] for s in stats)
+                frames = sum(s[1] for s in stats)
+                highest = max(s[2] for s in stats)
+                print(f"Workers: {num_workers}, Episodes: {episodes}, Highest Score= {highest}, "
+                      f"frames/sec: {(frames - last_frames) / (now - last_report):.0f}")
+                last_report, last_frames = now, frames
+            if now - last_snapshot >= SNAPSHOT_PERIOD:
+                save_snapshot(q_table)
+                last_snapshot = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for p in workers:
+            p.join()
+        print("=" * 20)
+        print("Saving data...")
+        save_snapshot(q_table)
+        del q_table
+        shm.close()
+        shm.unlink()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    train(*args)
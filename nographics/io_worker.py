@@ -0,0 +1,57 @@
+"""
+Background I/O: the game loop hands its disk writes and prints to one worker thread through a bounded queue.
+
+Everything submitted must already be a snapshot (a copy of the Q-table, a block of records):
+the game keeps changing its own objects while the worker writes.
+The queue is bounded: when the disk can't keep up, submit() blocks (back-pressure) instead of
+piling up snapshots in memory. close() (also run at exit) waits until everything is written.
+"""
+import atexit
+import queue
+import threading
+
+MAX_PENDING = 64  # jobs waiting in the queue before submit() blocks
+
+
+class IOWorker:
+    def __init__(self, max_pending=MAX_PENDING):
+        self.jobs = queue.Queue(max_pending)
+        self.error = None  # first exception raised by a job, raised again by flush()/close()
+        self.thread = threading.Thread(target=self.run, name="io-worker", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                fn, args, kwargs = job
+                fn(*args, **kwargs)
+            except Exception as error:
+                if self.error is None:
+                    self.error = error
+            finally:
+                self.jobs.task_done()
+
+    def submit(self, fn, *args, **kwargs):
+        """run fn(*args, **kwargs) on the worker, in submission order (blocks while the queue is full)"""
+        if not self.thread.is_alive():
+            fn(*args, **kwargs)  # after close(): write inline
+            return
+        self.jobs.put((fn, args, kwargs))
+
+    def flush(self):
+        """wait until every submitted job is done"""
+        self.jobs.join()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def close(self):
+        if self.thread.is_alive():
+            self.jobs.put(None)
+            self.thread.join()
+        atexit.unregister(self.close)
+        self.flush()
@@ -0,0 +1,146 @@
+"""
+Live state of a headless game in shared memory, for a viewer in another process (viewer.py).
+
+The trainer publishes a small fixed-layout record (bird, pipes, base, score, episode) at most
+PUBLISH_PERIOD times per second, and only while a viewer is attached: the viewer writes a heartbeat
+in the record, without it the trainer only reads the clock every CHECK_EVERY calls.
+The record is guarded by a sequence number (odd while it's written) so the viewer never draws half of a frame.
+"""
+import os
+import time
+import atexit
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+SHM_NAME = "flappy_bird_live"
+MAX_PIPES = 4  # pipes on the screen at once (DISTANCE = SCREENWIDTH / 2)
+PUBLISH_PERIOD = 1 / 60  # seconds between two records
+VIEWER_TIMEOUT = 1.0  # seconds without a heartbeat after which the viewer is considered gone
+CHECK_EVERY = 64  # publish() calls between two looks at the clock
+
+STATE = np.dtype([
+    ("seq", np.uint64),  # odd while the trainer writes the record
+    ("pid", np.int64),  # the trainer, 0 once it's gone
+    ("viewer_time", np.float64),  # heartbeat of the viewer (time.time())
+    ("episode", np.int64),
+    ("score", np.int32),
+    ("highest_score", np.int32),
+    ("game_state", np.int32),  # index in GAME_STATES: welcome, main, over
+    ("num_pipes", np.int32),
+    ("bird", np.float64, 5),  # left, right, bottom, top, angle
+    ("pipes", np.float64, (MAX_PIPES, 4)),  # left, right, lower_y, upper_y
+    ("base", np.float64, 2),  # left, right
+])
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class LiveStatePublisher:
+    def __init__(self, name=SHM_NAME, period=PUBLISH_PERIOD):
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=STATE.itemsize)
+        except FileExistsError:
+            # left by a trainer that crashed, unless it's still running
+            shm = shared_memory.SharedMemory(name)
+            owner = int(np.ndarray((), STATE, buffer=shm.buf)["pid"]) if shm.size >= STATE.itemsize else 0
+            if owner and owner != os.getpid() and pid_alive(owner):
+                shm.close()
+                raise FileExistsError(f"the live state {name} is published by another trainer (pid {owner})")
+            shm.close()
+            shm.unlink()
+            self.shm = shared_memory.SharedMemory(name, create=True, size=STATE.itemsize)
+        self.record = np.ndarray((), STATE, buffer=self.shm.buf)
+        self.shm.buf[:STATE.itemsize] = bytes(STATE.itemsize)
+        self.record["pid"] = os.getpid()
+        self.period = period
+        self.calls = CHECK_EVERY
+        self.next_time = 0.0
+        atexit.register(self.close)
+
+    def publish(self, game):
+        """copy the state of the game (main.FlappyBirdGame) if a viewer is attached and the period is over"""
+        self.calls -= 1
+        if self.calls:
+            return
+        self.calls = CHECK_EVERY
+        now = time.time()
+        if now < self.next_time or now - self.record["viewer_time"] > VIEWER_TIMEOUT:
+            return
+        self.next_time = now + self.period
+
+        r = self.record
+        r["seq"] += 1
+        r["episode"] = game.agent.num_episodes
+        r["score"] = game.SCORE
+        r["highest_score"] = game.highest_score
+        r["game_state"] = game.STATE_INDEX
+        bird = game.bird
+        r["bird"] = (bird.left, bird.right, bird.bottom, bird.top, bird.angle)
+        r["num_pipes"] = min(len(game.pipes), MAX_PIPES)
+        for i in range(r["num_pipes"]):
+            pipe = game.pipes[i]
+            r["pipes"][i] = (pipe.left, pipe.right, pipe.lower_y, pipe.upper_y)
+        r["base"] = (game.base.left, game.base.right)
+        r["seq"] += 1
+
+    def close(self):
+        if self.record is None:
+            return
+        self.record["pid"] = 0
+        self.record = None
+        self.shm.close()
+        self.shm.unlink()
+        atexit.unregister(self.close)
+
+
+class LiveStateReader:
+    def __init__(self, name=SHM_NAME):
+        self.name = name
+        self.shm = None
+        self.record = None
+
+    def attach(self):
+        try:
+            shm = shared_memory.SharedMemory(self.name)
+        except FileNotFoundError:
+            return False
+        # the segment belongs to the trainer: don't let this process unlink it at exit
+        resource_tracker.unregister(shm._name, "shared_memory")
+        self.shm = shm
+        self.record = np.ndarray((), STATE, buffer=shm.buf)
+        return True
+
+    def read(self):
+        """
+        a copy of the latest record, None while no trainer is publishing.
+        every call is also the viewer's heartbeat.
+        """
+        if self.record is None and not self.attach():
+            return None
+        pid = int(self.record["pid"])
+        if not pid or not pid_alive(pid):  # the trainer is gone
+            self.close()
+            return None
+        self.record["viewer_time"] = time.time()
+        for _ in range(100):
+            seq = int(self.record["seq"])
+            if seq & 1:
+                continue
+            state = self.record.copy()
+            if int(self.record["seq"]) == seq:
+                return state if seq else None  # nothing published yet
+        return None
+
+    def close(self):
+        if self.shm is not None:
+            self.record = None
+            self.shm.close()
+            self.shm = None
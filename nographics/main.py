@@ -1,17 +1,37 @@
 from classes import *
 from qlearn_agent import *
-import pandas as pd
+from replay_buffer import ReplayBuffer
+from planner import PrioritizedSweeping
+from checkpoint import CheckpointStore
+from io_worker import IOWorker
+from progress import ProgressReporter
+from game_rng import GameRNG
+from live_state import LiveStatePublisher
+from profiling import PhaseProfiler
+from math import ceil, floor
+import metrics_log
+import signal
+import time
 
 
 EXPLORATION = False
 LEARNING = False
+MACRO_STEP = False  # run the frames between two decisions at once (see fast_forward)
+REPLAY = 0  # number of stored transitions replayed after every real one while learning (0: no replay)
+PLANNING = 0  # number of model-based backups after every real transition while learning (0: no planning)
+REPORT_JSON = False  # progress reports as JSON records instead of text lines (see progress.py)
+CHECKPOINT_PERIOD = 0  # episodes between two versioned snapshots of a memory-mapped Q-table while learning (0: off)
+SEED = None  # seed of the pipes and of the agent's random draws: the same seed plays the same episodes (None: a new one)
+LIVE_VIEW = False  # publish the game state in shared memory for viewer.py (nothing is copied while no viewer is attached)
+PROFILE = False  # time the phases of the game loop (see profiling.py), reported on exit and on SIGUSR1
+PROFILE_SAMPLE = False  # with PROFILE: cProfile windows too, saved to profile.prof
 
 
 class FlappyBirdGame:
     agent: Q_learn
     next_pipe: Pipe
 
-    def __init__(self):
+    def __init__(self, q_table=None):
         # ######## to control the game ###############
         self.GAME_STATES = ["welcome", "main", "over"]
         self.STATE_SEQUENCE = cycle([1, 2, 0])
@@ -20,16 +40,12 @@ class FlappyBirdGame:
         self.DISTANCE = SCREENWIDTH / 2  # distance between pipes
         self.SCORE = 0
         self.previous_score = 0
-        try:
-            data = pd.read_csv(csv_file)
-            self.highest_score = data["score"].max()
-        except FileNotFoundError:
-            data = pd.DataFrame({"episode": [0], "score": [0]})
-            # Append the data to the CSV file
-            data.to_csv(csv_file, mode="a", index=False, header=True)
-            self.highest_score = 0
-        self.csv_episodes = []
-        self.csv_score = []
+        self.io = IOWorker()  # disk writes and prints leave the frame loop
+        self.metrics = self.open_metrics()
+        self.highest_score = self.metrics.highest_score
+        self.progress = ProgressReporter(lambda text: self.io.submit(print, text), as_json=REPORT_JSON)
+        self.progress.highest_score = self.highest_score
+        self.episode_frames = 0  # frames played in the current episode
         self.BP_SPEED = -4
         # ######## bird's control ########################
         self.ANGULAR_SPEED = 3
@@ -37,7 +53,7 @@ class FlappyBirdGame:
         self.JUMP_VELOCITY = 3
         self.GRAVITY = -0.2
         ###################################################
-        self.pipes = []  # contains all displayed pipes on the screen
+        self.pipes = None  # contains all displayed pipes on the screen (a PipeRing, the pipes are reused)
         self.bird = None
         self.base = None
         self.window = None
@@ -47,6 +63,11 @@ class FlappyBirdGame:
         self.counter = self.frames_per_step  # counter down to accumulate the number of frames
         self.agent = None
         self.next_pipe = None  # the pipe that the bird should focus on
+        self.q_table = q_table  # None: the agent loads its own table from q_table.npy
+        self.checkpoints = None  # CheckpointStore of the live table (CHECKPOINT_PERIOD)
+        self.obs = Observation()  # what the agent sees at a decision, refilled by observe()
+        self.rng = GameRNG(SEED, GAP_RANGE)  # every random draw of the game (see game_rng.py)
+        self.dump_requested = False  # set by SIGUSR1 while profiling (see init_profiler)
 
         self.run()
 
@@ -55,26 +76,101 @@ class FlappyBirdGame:
         self.frames()
 
 
+    def open_metrics(self):
+        return metrics_log.MetricsLog(log_file, csv_file, self.io)  # an old CSV log is converted once
+
     def init_objects(self):
-        self.pipes.append(Pipe())
-        self.next_pipe = self.pipes[0]
+        self.pipes = PipeRing(lambda: Pipe(self.rng, spawn=False))
+        self.next_pipe = self.pipes.spawn()
         self.bird = Bird(self.GRAVITY, self.ANGULAR_SPEED)
         self.bird.fly_speed = 0
         self.base = Base()
-        self.agent = Q_learn(self.get_state())
+        if LEARNING and CHECKPOINT_PERIOD and self.q_table is None:
+            # resume from the live memory-mapped table (or the latest valid snapshot)
+            self.checkpoints = CheckpointStore(cur_path + "/checkpoints")
+            self.q_table = self.checkpoints.open(NUM_STATES + (NUM_ACTIONS,), cur_path + "/q_table.npy")
+        if LEARNING and (REPLAY or PLANNING):
+            self.agent = FlatQ_learn(self.get_state(), self.q_table, self.rng)
+            if REPLAY:
+                self.agent.use_replay(ReplayBuffer(seed=self.rng.generator), REPLAY)
+            if PLANNING:
+                self.agent.use_planner(PrioritizedSweeping(self.agent.Q_flat, self.agent.gamma), PLANNING)
+        elif not LEARNING and not EXPLORATION:
+            self.agent = PolicyAgent(self.get_state(), self.q_table, self.rng)  # playing: decisions from the compiled greedy policy
+        else:
+            self.agent = Q_learn(self.get_state(), self.q_table, self.rng)
+        if self.checkpoints:
+            # after a crash the episodes log can be behind the snapshots (its buffered records are lost):
+            # the episode numbers go on from the newest snapshot, so the next ones are named after it
+            episode = max(self.agent.num_episodes, self.checkpoints.last_episode())
+            self.agent.num_episodes = self.agent.last_episode = episode
 
 # control the game loop ################################################################
     def frames(self):
+        live = None
+        if LIVE_VIEW:
+            try:
+                live = LiveStatePublisher()
+            except FileExistsError as error:
+                print(error)
+        profiler = self.init_profiler() if PROFILE else None
         try:
-            while True:
-                self.update_frame()
-                self.counter -= 1
+            if profiler is None:
+                while True:
+                    self.update_frame()
+                    self.counter -= 1
+                    if live is not None and self.counter == 0:
+                        live.publish(self)
+            else:
+                while True:
+                    profiler.sample()
+                    if self.dump_requested:
+                        self.dump_requested = False
+                        self.dump_profile(profiler)
+                    for _ in range(1000):
+                        self.update_frame()
+                        self.counter -= 1
+                        if live is not None and self.counter == 0:
+                            live.publish(self)
         except KeyboardInterrupt:
+            self.progress.report(self.agent)
+            if profiler is not None:
+                self.dump_profile(profiler)
+            self.io.flush()
             if LEARNING:
                 print("=" * 20)
                 print("Saving data...")
                 self.save_data(True, True)
-
+        finally:
+            if live is not None:
+                live.close()  # unlinks the shared memory segment
+
+
+    def init_profiler(self):
+        # the phases' methods are replaced on the instance: nothing changes when PROFILE is off
+        profiler = PhaseProfiler(PROFILE_SAMPLE)
+        self.update_frame = profiler.wrap("physics", self.update_frame)  # what isn't in the other phases
+        self.fast_forward = profiler.wrap("physics", self.fast_forward)
+        self.update_pipes = profiler.wrap("pipes", self.update_pipes)
+        self.update_score = profiler.wrap("pipes", self.update_score)
+        self.check_crash = profiler.wrap("crash", self.check_crash)
+        self.observe = profiler.wrap("state", self.observe)
+        self.agent.index_observation = profiler.wrap("state", self.agent.index_observation)
+        self.get_reward = profiler.wrap("reward", self.get_reward)
+        self.agent_decide = profiler.wrap("action", self.agent_decide)
+        self.agent.learn_index = profiler.wrap("learn", self.agent.learn_index)
+        self.save_data = profiler.wrap("logging", self.save_data)
+        if hasattr(signal, "SIGUSR1"):  # kill -USR1 <pid>: report without stopping
+            # only a flag here: the handler may interrupt the frame loop inside io.submit(), holding its lock.
+            # the report is written by the loop, between two chunks of frames
+            signal.signal(signal.SIGUSR1, self.request_dump)
+        return profiler
+
+    def request_dump(self, signum, frame):
+        self.dump_requested = True
+
+    def dump_profile(self, profiler):
+        profiler.dump(lambda text: self.io.submit(print, text), cur_path + "/profile.prof")
 
     def update_frame(self):
         if self.GAME_STATES[self.STATE_INDEX] == "welcome":
@@ -89,13 +185,22 @@ class FlappyBirdGame:
         elif self.GAME_STATES[self.STATE_INDEX] == "main":
             # agent take decision
             if self.counter == 0:
-                state = self.get_state()
+                state_index = self.agent.index_observation(self.observe())
                 if LEARNING:
-                    self.agent.learn(state, self.get_reward())
-                self.agent_decide(state)
+                    self.agent.learn_index(state_index, self.get_reward())
+                self.agent_decide(state_index)
                 self.counter = self.frames_per_step
 
+            if MACRO_STEP:
+                # all frames until the next decision, frames() will bring the counter down to 0.
+                crashed = self.fast_forward(self.counter)
+                self.counter = 1
+                if crashed:
+                    self.STATE_INDEX = next(self.STATE_SEQUENCE)
+                return
+
             # update the frame
+            self.episode_frames += 1
             self.base.move(self.BP_SPEED)
             for pipe in self.pipes:
                 pipe.move(self.BP_SPEED)
@@ -108,7 +213,7 @@ class FlappyBirdGame:
 
         elif self.GAME_STATES[self.STATE_INDEX] == "over":
             if LEARNING:
-                self.agent.learn(self.get_state(), self.get_reward(), done=True)
+                self.agent.learn_index(self.agent.index_observation(self.observe()), self.get_reward(), done=True)
             else:
                 self.agent.reset()
             self.reset()
@@ -128,11 +233,86 @@ class FlappyBirdGame:
 
         return False
 
+    def fast_forward(self, n):
+        """
+        Macro-step: the same result as "n" calls of the main game frame, computed at once.
+        Pipes and base move by a constant shift, so the frames at which the first pipe leaves,
+        a new pipe comes and the bird passes a pipe are solved in closed form.
+        The bird is integrated on local variables with exactly the float operations of Bird.move
+        so the trajectory is identical to the per-frame engine.
+        It stops at the crash frame, returns True if the bird crashed.
+        """
+        bird = self.bird
+        pipes = self.pipes
+        speed = -self.BP_SPEED
+        first = pipes[0]
+        second = pipes[1] if len(pipes) > 1 else None
+        # frame at which the first pipe leaves the screen (right < 0)
+        k_pop = floor(first.right / speed) + 1
+        # frame at which a new pipe is added (last pipe's left <= DISTANCE)
+        k_push = max(ceil((pipes[-1].left - self.DISTANCE) / speed), 1)
+        # frame at which the bird passes the pipe it's focusing on
+        k_score = n + 1
+        if not first.count:
+            k_score = max(ceil((first.right - bird.left) / speed), 1)
+        elif second is not None:
+            k_score = max(ceil((second.right - bird.left) / speed), k_pop)
+
+        # integrate the bird and look for the crash frame
+        bottom, top, velocity, angle = bird.bottom, bird.top, bird.velocity, bird.angle
+        angular_s, gravity = bird.angular_s, bird.gravity
+        base_right = self.base.right
+        frames = n
+        crashed = False
+        for k in range(1, n + 1):
+            if base_right <= SCREENWIDTH + 1:
+                base_right = 2 * SCREENWIDTH
+            base_right -= speed
+
+            if bottom > BASEY:
+                bottom += velocity
+                top += velocity
+                if velocity >= 0:
+                    if angle < 30:
+                        angle += angular_s
+                elif angle > -90:
+                    angle -= angular_s * 0.3
+            if top >= SCREENHEIGHT:
+                velocity = 0
+            velocity += gravity
+
+            pipe = first if k < k_pop else second
+            left = pipe.left - speed * k
+            right = pipe.right - speed * k
+            if (bird.right > left and bird.left < right and (bottom < pipe.lower_y or top > pipe.upper_y)) \
+                    or bottom <= BASEY:
+                frames = k
+                crashed = True
+                break
+
+        # write the state of the last frame back
+        self.episode_frames += frames
+        bird.bottom, bird.top, bird.velocity, bird.angle = bottom, top, velocity, angle
+        self.base.right = base_right
+        self.base.left = base_right - self.base.width
+        for pipe in pipes:
+            pipe.move(-speed * frames)
+        if k_pop <= frames:
+            pipes.popleft()
+        if k_push <= frames:
+            pipes.spawn().move(-speed * (frames - k_push))
+        if k_score <= frames:
+            pipe = first if k_score < k_pop else second
+            self.SCORE += 1
+            pipe.count = True
+            self.next_pipe = pipes[pipes.index(pipe) + 1]
+        return crashed
+
     def update_pipes(self):
         if self.pipes[0].right < 0:
-            self.pipes.pop(0)
+            self.pipes.popleft()
         if self.pipes[-1].left <= self.DISTANCE:
-            self.pipes.append(Pipe())
+            self.pipes.spawn()
 
     def update_score(self):
         pipe = self.pipes[0]
@@ -158,11 +338,16 @@ class FlappyBirdGame:
         }
         return state
 
+    def observe(self):
+        """the observation of the current frame in self.obs (one pass, no dict), used by the agent and get_reward()"""
+        return self.obs.update(self.bird, self.next_pipe)
+
     def get_reward(self):
-        state = self.get_state()
+        # reward of the frame last observed by observe()
+        obs = self.obs
 
         # if crashed ...........................
-        if state['game_state'] == 'over':
+        if self.GAME_STATES[self.STATE_INDEX] == 'over':
             return -200
 
         # if it didn't crash ...................
@@ -172,39 +357,27 @@ class FlappyBirdGame:
             reward += 100
             self.previous_score = self.SCORE
 
-        bird_centre = state['bird_y']
-        bird_v = state['bird_v']
-        gap_x = state['pipe_positions'][0] - self.next_pipe.width * 0.5
-        gap_y = state['pipe_positions'][1]
-        gap_top = self.next_pipe.upper_y
-        gap_down = self.next_pipe.lower_y
-        bird_height = self.bird.height
-        gap_size_quarter = self.next_pipe.gap_size * 0.35
-
+        region = obs.region
         # encourage the bird to be inside the scope of the gap
-        if gap_down + gap_size_quarter <= bird_centre <= gap_top - gap_size_quarter:
+        if region == Observation.SCOPE:
             reward += 60
-        elif gap_down + bird_height <= bird_centre <= gap_top - bird_height:  # within the gap exactly
-            if bird_centre < gap_y and bird_v >= 0:
+        elif region == Observation.GAP:  # within the gap exactly
+            if obs.bird_y < obs.gap_y and obs.bird_v >= 0:
                 reward += 10
-            if bird_centre > gap_y and bird_v <= 0:
+            if obs.bird_y > obs.gap_y and obs.bird_v <= 0:
                 reward += 10
             reward += 20
-        elif bird_centre < gap_down + bird_height:  # bird lower than the gap
-            pipe_bird_distance_x = gap_x - self.bird.right
-            pipe_bird_distance_y = gap_down - bird_centre
-            if pipe_bird_distance_y < pipe_bird_distance_x:  # scope within 45deg lower than the gap
-                if bird_v <= 0:
+        elif region == Observation.BELOW:  # bird lower than the gap
+            if obs.dy < obs.dx:  # scope within 45deg lower than the gap
+                if obs.bird_v <= 0:
                     reward -= 10
                 else:
                     reward += 10
             else:
                 reward -= 10
-        elif bird_centre > gap_top - bird_height:  # bird higher than the gap
-            pipe_bird_distance_x = gap_x - self.bird.right
-            pipe_bird_distance_y = bird_centre - gap_top
-            if pipe_bird_distance_y < pipe_bird_distance_x:  # scope within 45deg higher than the gap
-                if bird_v > 0:
+        else:  # bird higher than the gap
+            if obs.dy < obs.dx:  # scope within 45deg higher than the gap
+                if obs.bird_v > 0:
                     reward -= 10
                 else:
                     reward += 10
@@ -213,32 +386,32 @@ class FlappyBirdGame:
 
         return reward
 
-    def agent_decide(self, state):
-        action = self.agent.take_action(state, EXPLORATION)
-        if action == "jump":
+    def agent_decide(self, state_index):
+        if self.agent.act(state_index, EXPLORATION):  # "jump"
             if self.STATE_INDEX == 1:  # state is MAIN GAME, hence make the self.bird jump.
                 self.bird.velocity = self.JUMP_VELOCITY  # make self.bird go up
 
     # helpful methods ##############################################################
     def save_data(self, force=False, skip=False):
         if not skip:
-            print(f"Episode: {self.agent.num_episodes}, Score: {self.SCORE},  Highest Score= {self.highest_score}")
-            self.csv_episodes.append(self.agent.num_episodes)
-            self.csv_score.append(self.SCORE)
+            self.progress.episode(self.agent, self.SCORE, self.episode_frames)
+            if LEARNING:
+                self.metrics.append(self.agent.num_episodes, self.SCORE, self.episode_frames, time.time())
+                if self.checkpoints and self.agent.num_episodes % CHECKPOINT_PERIOD == 0:
+                    self.agent.save_checkpoint(self.checkpoints, self.io)
         if LEARNING and force:
-            self.agent.save_q_table()
-        if LEARNING and (len(self.csv_episodes) == 500 or force):
-            # Create a DataFrame with the episode and score data
-            data = pd.DataFrame({"episode": self.csv_episodes, "score": self.csv_score})
-            # Append the data to the CSV file
-            data.to_csv(csv_file, mode="a", index=False, header=False)
-            self.csv_episodes.clear()
-            self.csv_score.clear()
+            self.agent.save_q_table(self.io)
+            if self.checkpoints:
+                self.q_table.flush()
+                self.agent.save_checkpoint(self.checkpoints, self.io)
+            self.metrics.flush()
+            self.io.flush()
 
     def reset(self):
         self.save_data()
-        self.pipes = [Pipe()]
-        self.next_pipe = self.pipes[0]
+        self.episode_frames = 0
+        self.pipes.clear()
+        self.next_pipe = self.pipes.spawn()
         self.bird.reset()
 
         # update the highest score
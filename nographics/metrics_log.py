@@ -0,0 +1,141 @@
+"""
+Append-only binary log of the episodes: fixed 32-byte records (episode, score, frames, time)
+after a 64-byte header that keeps the running aggregates, so opening a log never reads the records.
+
+usage:  python metrics_log.py data.csv [data.bin]   -> converts an old CSV log
+"""
+import os
+import sys
+import struct
+import numpy as np
+
+RECORD = np.dtype([('episode', '<i8'), ('score', '<i8'), ('frames', '<i8'), ('time', '<f8')])
+# magic, version, record size, number of records, last episode, highest score, sum of scores
+HEADER = struct.Struct('<8sIIqqqd')
+HEADER_SIZE = 64
+MAGIC = b'FLAPPYQL'
+VERSION = 1
+BUFFER_RECORDS = 500  # records kept in memory between two writes
+
+
+class MetricsLog:
+    def __init__(self, path, csv_path=None, io=None):
+        """
+        open (or create) the log at "path".
+        a missing log is first filled from "csv_path" if that old CSV log exists.
+        with an io_worker.IOWorker "io", the blocks of records are written by its thread.
+        """
+        self.path = path
+        self.io = io
+        if not os.path.exists(path) and csv_path is not None and os.path.exists(csv_path):
+            convert_csv(csv_path, path)
+        self.file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        self.buffer = []
+        self.count, self.last_episode, self.highest_score, self.score_sum = read_aggregates(self.file)
+        if self.count == 0 and os.fstat(self.file.fileno()).st_size < HEADER_SIZE:
+            self.write_header()
+
+    def append(self, episode, score, frames=0, time=0.0):
+        self.buffer.append((episode, score, frames, time))
+        self.count += 1
+        self.last_episode = max(self.last_episode, episode)
+        self.highest_score = max(self.highest_score, score)
+        self.score_sum += score
+        if len(self.buffer) >= BUFFER_RECORDS:
+            self.flush()
+
+    def flush(self):
+        # snapshot the records and the header here, the writing may happen on the I/O thread
+        offset = HEADER_SIZE + (self.count - len(self.buffer)) * RECORD.itemsize
+        records = np.array(self.buffer, dtype=RECORD).tobytes()
+        self.buffer = []
+        if self.io is None:
+            self.write(offset, records, self.header())
+        else:
+            self.io.submit(self.write, offset, records, self.header())
+
+    def write(self, offset, records, header):
+        # records first, then the header: a crash in between is repaired when the log is opened again
+        if records:
+            self.file.seek(offset)
+            self.file.write(records)
+        self.file.seek(0)
+        self.file.write(header)
+        self.file.flush()
+
+    def header(self):
+        return HEADER.pack(MAGIC, VERSION, RECORD.itemsize, self.count,
+                           self.last_episode, self.highest_score, self.score_sum).ljust(HEADER_SIZE, b'\0')
+
+    def write_header(self):
+        self.file.seek(0)
+        self.file.write(self.header())
+
+    def close(self):
+        self.flush()
+        if self.io is not None:
+            self.io.submit(self.file.close)
+        else:
+            self.file.close()
+
+    @property
+    def mean_score(self):
+        return self.score_sum / self.count if self.count else 0
+
+
+def read_aggregates(file):
+    """(count, last episode, highest score, sum of scores) from the header of an open log"""
+    size = os.fstat(file.fileno()).st_size
+    if size < HEADER_SIZE:
+        return 0, 0, 0, 0.0
+    file.seek(0)
+    magic, version, record_size, count, last_episode, highest_score, score_sum = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC or record_size != RECORD.itemsize:
+        raise ValueError(f"{file.name} is not an episode log (version {VERSION})")
+    if count != (size - HEADER_SIZE) // RECORD.itemsize:
+        # interrupted between writing records and header: recompute from the records
+        records = np.fromfile(file.name, dtype=RECORD, offset=HEADER_SIZE)
+        count = len(records)
+        last_episode = int(records['episode'].max(initial=0))
+        highest_score = int(records['score'].max(initial=0))
+        score_sum = float(records['score'].sum())
+    return count, last_episode, highest_score, score_sum
+
+
+def summary(path):
+    """the header aggregates of the log at "path" without opening it for writing"""
+    if not os.path.exists(path):
+        return 0, 0, 0, 0.0
+    with open(path, 'rb') as file:
+        return read_aggregates(file)
+
+
+def load(path):
+    """all the records as a zero-copy structured np.memmap (fields: episode, score, frames, time)"""
+    count = summary(path)[0]
+    if count == 0:
+        return np.zeros(0, dtype=RECORD)
+    return np.memmap(path, dtype=RECORD, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+
+def convert_csv(csv_path, path):
+    import pandas as pd
+
+    data = pd.read_csv(csv_path)
+    log = MetricsLog(path)
+    records = np.zeros(len(data), dtype=RECORD)
+    records['episode'] = data['episode']
+    records['score'] = data['score']
+    log.file.seek(HEADER_SIZE + log.count * RECORD.itemsize)
+    log.file.write(records.tobytes())
+    log.count += len(records)
+    log.last_episode = max(log.last_episode, int(records['episode'].max(initial=0)))
+    log.highest_score = max(log.highest_score, int(records['score'].max(initial=0)))
+    log.score_sum += float(records['score'].sum())
+    log.close()
+    print(f"{len(records)} episodes converted from {csv_path} to {path}")
+
+
+if __name__ == "__main__":
+    csv_path = sys.argv[1]
+    convert_csv(csv_path, sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(csv_path)[0] + ".bin")
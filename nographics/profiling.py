@@ -0,0 +1,98 @@
+"""
+Where the time of the headless game loop goes.
+
+PhaseProfiler counts the calls and the time (perf_counter_ns, exclusive: "state" called from "reward"
+isn't counted in "reward") of the game's methods, grouped by phase. The methods are wrapped on
+the instance, so a game without a profiler runs its usual code. The wrappers cost about 1 us per call,
+counted in the calling phase (mostly "physics", the rest of a frame).
+Optionally cProfile runs during a window of SAMPLE_WINDOW seconds every SAMPLE_PERIOD seconds,
+its statistics accumulate over the windows.
+dump() writes the report (and the cProfile statistics to a .prof file for pstats / snakeviz).
+"""
+import io
+import time
+import pstats
+import cProfile
+
+PHASES = ("physics", "pipes", "crash", "state", "reward", "action", "learn", "logging")
+SAMPLE_PERIOD = 30  # seconds between the starts of two cProfile windows
+SAMPLE_WINDOW = 1  # seconds of a cProfile window
+TOP_FUNCTIONS = 25  # functions in the cProfile part of the report
+
+
+class PhaseProfiler:
+    def __init__(self, sample=False, phases=PHASES):
+        self.phases = phases
+        self.ns = dict.fromkeys(phases, 0)
+        self.calls = dict.fromkeys(phases, 0)
+        self.nested = 0  # ns spent in wrapped calls inside the running one
+        self.start = time.perf_counter_ns()
+        self.profile = cProfile.Profile() if sample else None
+        self.profiling = False
+        self.next_window = time.perf_counter()  # the first window starts right away
+
+    def wrap(self, phase, fn):
+        """fn timed as "phase", e.g. game.check_crash = profiler.wrap("crash", game.check_crash)"""
+        ns, calls = self.ns, self.calls
+
+        def timed(*args, **kwargs):
+            outer, self.nested = self.nested, 0
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                ns[phase] += elapsed - self.nested
+                calls[phase] += 1
+                self.nested = outer + elapsed
+        return timed
+
+    def sample(self):
+        """called between two chunks of frames: starts or stops the cProfile window"""
+        if self.profile is None:
+            return
+        now = time.perf_counter()
+        if not self.profiling and now >= self.next_window:
+            self.profile.enable()
+            self.profiling = True
+            self.next_window = now + SAMPLE_PERIOD
+        elif self.profiling and now >= self.next_window - SAMPLE_PERIOD + SAMPLE_WINDOW:
+            self.profile.disable()
+            self.profiling = False
+
+    def report(self):
+        wall = (time.perf_counter_ns() - self.start) / 1e9
+        total = sum(self.ns.values()) / 1e9
+        lines = [f"phases over {wall:.1f}s ({total / max(wall, 1e-9):.0%} of it in the timed phases):"]
+        for phase in self.phases:
+            seconds, calls = self.ns[phase] / 1e9, self.calls[phase]
+            lines.append(f"  {phase:8s} {calls:11d} calls {seconds:9.3f}s {seconds / max(wall, 1e-9):6.1%}"
+                         f" {seconds / calls * 1e6 if calls else 0:8.2f} us/call")
+        if self.profile is not None:
+            stats = self.stats()
+            if stats is not None:
+                text = io.StringIO()
+                stats.stream = text
+                stats.sort_stats("tottime").print_stats(TOP_FUNCTIONS)
+                lines.append("cProfile windows:\n" + text.getvalue())
+        return "\n".join(lines)
+
+    def stats(self):
+        """pstats.Stats of the cProfile windows so far (None before the first one)"""
+        if self.profiling:
+            self.profile.disable()
+        try:
+            return pstats.Stats(self.profile)
+        except TypeError:  # nothing profiled yet
+            return None
+        finally:
+            if self.profiling:
+                self.profile.enable()
+
+    def dump(self, emit=print, path=None):
+        """emit(text) the report, the cProfile statistics are also saved to "path" (a .prof file)"""
+        emit(self.report())
+        if path is not None and self.profile is not None:
+            stats = self.stats()
+            if stats is not None:
+                stats.dump_stats(path)
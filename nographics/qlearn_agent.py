@@ -1,12 +1,13 @@
 import random
 import numpy as np
-import pandas as pd
+import metrics_log
 from pathlib import Path
 
 
 cur_path = str(Path(__file__).parent.resolve())
 
 csv_file = "data.csv"
+log_file = "data.bin"  # episodes log, see metrics_log.py
 
 # ranges of state variables
 RANGE = {
@@ -23,6 +24,19 @@ bucket_num = [int(i) for i in [
     (RANGE['gap_y'][1] - RANGE['gap_y'][0]) / BUCKET_SIZE[2]
                                 ]]
 
+# shape of the Q-table
+NUM_STATES = (bucket_num[0] + 1,  # num of bird_y buckets
+              2,   # num of bird_velocity buckets
+              bucket_num[1] + 1,  # num of gap_x buckets
+              bucket_num[2] + 1  # num of gap_y buckets
+              )
+NUM_ACTIONS = 2
+# strides of (bird_y, bird_v, gap_x, gap_y) in the flat state index
+STATE_STRIDES = (NUM_STATES[1] * NUM_STATES[2] * NUM_STATES[3],
+                 NUM_STATES[2] * NUM_STATES[3],
+                 NUM_STATES[3],
+                 1)
+
 
 def mapping(sample, start, bucket_size):
     index = (sample - start) // bucket_size
@@ -41,15 +55,18 @@ def map_state_to_index(state):
         'game_state':
     }
     """
-    bird_y = mapping(state['bird_y'], RANGE['bird_y'][0], BUCKET_SIZE[0])
+    return state_indexes(state['bird_y'], state['bird_v'], *state['pipe_positions'])
+
 
-    bird_v = 1
-    if state['bird_v'] < 0:
-        bird_v = 0
+def state_indexes(bird_y, bird_v, gap_x, gap_y):
+    """map_state_to_index() of the values themselves (e.g. of a classes.Observation)"""
+    bird_y = mapping(bird_y, RANGE['bird_y'][0], BUCKET_SIZE[0])
 
-    pipe_x = mapping(state['pipe_positions'][0], RANGE['gap_x'][0], BUCKET_SIZE[1])
+    bird_v = 0 if bird_v < 0 else 1
+
+    pipe_x = mapping(gap_x, RANGE['gap_x'][0], BUCKET_SIZE[1])
     pipe_x = pipe_x if pipe_x < bucket_num[1] else bucket_num[1]
-    pipe_y = mapping(state['pipe_positions'][1], RANGE['gap_y'][0], BUCKET_SIZE[2])
+    pipe_y = mapping(gap_y, RANGE['gap_y'][0], BUCKET_SIZE[2])
 
     indexes = (
         bird_y,
@@ -61,34 +78,60 @@ def map_state_to_index(state):
     return indexes  # It's a tuple to be used in indexing a np array
 
 
+def flat_state_index(bird_y, bird_v, gap_x, gap_y):
+    """
+    same buckets as map_state_to_index() folded into one integer,
+    the row of the state in a Q-table of shape (num of states, num of actions).
+    """
+    pipe_x = int((gap_x - RANGE['gap_x'][0]) // BUCKET_SIZE[1])
+    if pipe_x > bucket_num[1]:
+        pipe_x = bucket_num[1]
+    return (int((bird_y - RANGE['bird_y'][0]) // BUCKET_SIZE[0]) * STATE_STRIDES[0]
+            + (bird_v >= 0) * STATE_STRIDES[1]
+            + pipe_x * STATE_STRIDES[2]
+            + int((gap_y - RANGE['gap_y'][0]) // BUCKET_SIZE[2]))
+
+
+def flat_state_indices(bird_y, bird_v, gap_x, gap_y):
+    """flat_state_index() over arrays of states (e.g. all the games of a VecFlappyEnv)"""
+    pipe_x = np.minimum((np.asarray(gap_x) - RANGE['gap_x'][0]) // BUCKET_SIZE[1], bucket_num[1])
+    index = (((np.asarray(bird_y) - RANGE['bird_y'][0]) // BUCKET_SIZE[0]) * STATE_STRIDES[0]
+             + (np.asarray(bird_v) >= 0) * STATE_STRIDES[1]
+             + pipe_x * STATE_STRIDES[2]
+             + (np.asarray(gap_y) - RANGE['gap_y'][0]) // BUCKET_SIZE[2])
+    return index.astype(np.int64)
+
+
+def load_q_table(shape):
+    try:
+        return np.load(cur_path + "/q_table.npy")
+    except FileNotFoundError:
+        return np.zeros(shape)
+
+
 class Q_learn:
-    def __init__(self, state):
+    def __init__(self, state, Q=None, rng=None):
         self.init_state_index = map_state_to_index(state)
         self.state_index = self.init_state_index
         self.next_state_index = None
         self.action_index = 1
         # Initialize Q-table
-        self.num_states = (bucket_num[0] + 1,  # num of bird_y buckets
-                           2,   # num of bird_velocity buckets
-                           bucket_num[1] + 1,  # num of gap_x buckets
-                           bucket_num[2] + 1  # num of gap_y buckets
-                           )
-        self.num_actions = (2,)  # It's a tuple
-        try:
-            self.Q = np.load(cur_path + "/q_table.npy")
-        except FileNotFoundError:
-            self.Q = np.zeros(self.num_states + self.num_actions)
+        self.num_states = NUM_STATES
+        self.num_actions = (NUM_ACTIONS,)  # It's a tuple
+        if Q is not None:  # a table owned by someone else (e.g. shared memory)
+            self.Q = Q
+        else:
+            self.Q = load_q_table(self.num_states + self.num_actions)
 
         # Set hyper parameters
         self.alpha = 0.1
         self.gamma = 0.5
-        try:
-            data = pd.read_csv(csv_file)
-            self.num_episodes = data["episode"].max()
-        except FileNotFoundError:
-            self.num_episodes = 0
+        self.num_episodes = metrics_log.summary(log_file)[1]  # last logged episode
         self.last_episode = self.num_episodes
 
+        # random draws: the game's GameRNG (see game_rng.py), or the random module
+        self.random = rng if rng is not None else random
+
         # Define epsilon (the exploration rate)
         self.epsilon = 0.03
 
@@ -100,37 +143,51 @@ class Q_learn:
     # Define a function to select an action using epsilon-greedy strategy
     def epsilon_greedy(self, state_index):
         # Choose a random action with probability epsilon
-        if random.uniform(0, 1) < self.epsilon:
-            action_index = random.randrange(0, self.Q[state_index].size)
+        if self.random.uniform(0, 1) < self.epsilon:
+            action_index = self.random.randrange(0, self.Q[state_index].size)
         # Otherwise, choose the action with the highest Q-value
         else:
-            max_value = max(self.Q[state_index])
-            actions_indices = [i for i, v in enumerate(self.Q[state_index]) if v == max_value]
-            action_index = random.choice(actions_indices)
+            # copy the row once: another process may be updating a shared table meanwhile
+            q_values = self.Q[state_index].copy()
+            max_value = max(q_values)
+            actions_indices = [i for i, v in enumerate(q_values) if v == max_value]
+            action_index = self.random.choice(actions_indices)
 
         self.action_index = action_index
         return action_index
 
+    @staticmethod
+    def index_observation(obs):
+        """the state index of a classes.Observation, for act() and learn_index()"""
+        return state_indexes(obs.bird_y, obs.bird_v, obs.gap_x, obs.gap_y)
+
     def take_action(self, state, exploration=True):
         """
         It maps "action_index = 1" to "jump"
         and "action_index = 0" to " " meaning no jump
         """
-        state_index = map_state_to_index(state)
+        return "jump" if self.act(map_state_to_index(state), exploration) else " "
+
+    def act(self, state_index, exploration=True):
+        """returns the action index: 1 means "jump" and 0 means no jump."""
         if exploration:  # True during learning
-            action = "jump" if self.epsilon_greedy(state_index) else " "
-        else:
-            max_value = max(self.Q[state_index])
-            actions_indices = [i for i, v in enumerate(self.Q[state_index]) if v == max_value]
-            self.action_index = random.choice(actions_indices)
-            action = "jump" if self.action_index else " "
-        return action
+            return self.epsilon_greedy(state_index)
+        q_values = self.Q[state_index].copy()
+        max_value = max(q_values)
+        actions_indices = [i for i, v in enumerate(q_values) if v == max_value]
+        self.action_index = self.random.choice(actions_indices)
+        return self.action_index
 
     # Q-learning algorithm
     def learn(self, state, reward, done=False):
-        self.next_state_index = map_state_to_index(state)
+        self.learn_index(map_state_to_index(state), reward, done)
+
+    def learn_index(self, next_state_index, reward, done=False):
+        self.next_state_index = next_state_index
         # Update Q-value for state-action pair
-        td_error = reward + self.gamma * np.max(self.Q[self.next_state_index]) - self.Q[self.state_index + (self.action_index,)]
+        # a finished episode doesn't bootstrap from the crash state (as in learn_batch and the planner)
+        target = reward if done else reward + self.gamma * np.max(self.Q[self.next_state_index])
+        td_error = target - self.Q[self.state_index + (self.action_index,)]
         self.Q[self.state_index + (self.action_index,)] += self.alpha * td_error
 
         # update state
@@ -141,17 +198,212 @@ class Q_learn:
             self.reset()
             # print(self.Q.shape)
 
-    def save_q_table(self):
-        np.save(cur_path + "/q_table.npy", self.Q, allow_pickle=True)
+    def save_q_table(self, io=None):
+        """with an io_worker.IOWorker "io", a copy of the table is saved by its thread"""
+        if io is None:
+            np.save(cur_path + "/q_table.npy", self.Q, allow_pickle=True)
+        else:
+            io.submit(np.save, cur_path + "/q_table.npy", np.array(self.Q), allow_pickle=True)
+
+    def save_checkpoint(self, store, io=None):
+        """versioned snapshot of the table (with the hyper parameters) in a checkpoint.CheckpointStore"""
+        hyper_parameters = dict(alpha=self.alpha, gamma=self.gamma, epsilon=self.epsilon)
+        if io is None:
+            store.snapshot(self.Q, self.num_episodes, **hyper_parameters)
+        else:
+            io.submit(store.snapshot, np.array(self.Q), self.num_episodes, **hyper_parameters)
+
+
+class FlatQ_learn(Q_learn):
+    """
+    Q_learn backend working on a flat view of the Q-table.
+    states are single integers from flat_state_index(), Q-values of state "s" are
+    self.Q_flat[2 * s] (no jump) and self.Q_flat[2 * s + 1] (jump).
+    The dict interface (take_action / learn) is kept, act / learn_index skip the dicts.
+    """
+    def __init__(self, state, Q=None, rng=None):
+        super().__init__(state, Q, rng)
+        self.Q = np.ascontiguousarray(self.Q)
+        self.Q_flat = self.Q.reshape(-1)  # a view: updates are seen in self.Q and saved with it
+        self.init_state_index = self.state_index = self.index_of(state)
+        self.rng = rng.generator if rng is not None else np.random.default_rng()  # random draws of the batch methods
+        # scratch buffers of learn_batch
+        self.td_sum = np.zeros(self.Q_flat.size)
+        self.td_count = np.zeros(self.Q_flat.size)
+        # experience replay (see use_replay)
+        self.replay = None
+        self.replay_k = 0
+        # model-based planning (see use_planner)
+        self.planner = None
+        self.planning_steps = 0
+
+    @staticmethod
+    def index_of(state):
+        return flat_state_index(state['bird_y'], state['bird_v'], *state['pipe_positions'])
+
+    @staticmethod
+    def index_observation(obs):
+        return flat_state_index(obs.bird_y, obs.bird_v, obs.gap_x, obs.gap_y)
+
+    def greedy(self, state_index):
+        no_jump = self.Q_flat[2 * state_index]
+        jump = self.Q_flat[2 * state_index + 1]
+        if no_jump == jump:
+            return 1 if self.random.random() < 0.5 else 0
+        return 1 if jump > no_jump else 0
+
+    def act(self, state_index, exploration=True):
+        """returns the action index: 1 means "jump" and 0 means no jump."""
+        if exploration and self.random.random() < self.epsilon:
+            self.action_index = self.random.randrange(NUM_ACTIONS)
+        else:
+            self.action_index = self.greedy(state_index)
+        return self.action_index
+
+    def learn_index(self, next_state_index, reward, done=False):
+        Q = self.Q_flat
+        i = 2 * self.state_index + self.action_index
+        target = reward if done else reward + self.gamma * max(Q[2 * next_state_index], Q[2 * next_state_index + 1])
+        Q[i] += self.alpha * (target - Q[i])
+
+        if self.replay is not None:
+            self.replay.add(self.state_index, self.action_index, reward, next_state_index, done)
+            if len(self.replay) >= self.replay_k:
+                self.learn_replay(self.replay_k)
+        if self.planner is not None:
+            self.planner.observe(self.state_index, self.action_index, reward, next_state_index, done)
+            self.planner.plan(self.planning_steps)
+
+        self.state_index = self.next_state_index = next_state_index
+        if done:
+            self.reset()
+
+    def use_replay(self, buffer, k):
+        """store every real transition in "buffer" and replay k sampled ones after each of them."""
+        self.replay = buffer
+        self.replay_k = k
+
+    def use_planner(self, planner, n):
+        """feed every real transition to "planner" (e.g. PrioritizedSweeping) and run n backups after each."""
+        self.planner = planner
+        self.planning_steps = n
+
+    def learn_replay(self, k):
+        i = self.replay.sample(k)
+        td_errors = self.learn_batch(*self.replay.transitions(i))
+        self.replay.update_priorities(i, td_errors)
+
+    # batch methods: many states / transitions in one call ###################
+    def act_batch(self, state_idx, epsilon=None):
+        """epsilon-greedy actions (0 or 1) for an array of flat state indexes."""
+        if epsilon is None:
+            epsilon = self.epsilon
+        q_values = self.Q_flat.reshape(-1, NUM_ACTIONS)[state_idx]
+        no_jump, jump = q_values[:, 0], q_values[:, 1]
+        coin = self.rng.random(len(q_values)) < 0.5
+        actions = np.where(jump == no_jump, coin, jump > no_jump)
+        explore = self.rng.random(len(q_values)) < epsilon
+        actions[explore] = self.rng.integers(0, NUM_ACTIONS, np.count_nonzero(explore))
+        return actions.astype(np.int64)
+
+    def learn_batch(self, state_idx, actions, rewards, next_state_idx, dones):
+        """
+        TD updates of a batch of transitions in one call.
+        All the TD errors are computed from the table as it was before the batch.
+        When a (state, action) pair appears several times, its TD errors are accumulated with
+        np.add.at and the entry moves "alpha" towards their mean (one update with the averaged target),
+        so a batch of identical transitions is one learn() step, not len(batch) steps.
+        As in learn(), a finished episode (done) doesn't bootstrap from the crash state.
+        returns the TD errors of the batch.
+        """
+        Q = self.Q_flat
+        i = NUM_ACTIONS * np.asarray(state_idx) + actions
+        next_q = Q.reshape(-1, NUM_ACTIONS)[next_state_idx]
+        target = rewards + self.gamma * next_q.max(axis=1) * ~np.asarray(dones, dtype=bool)
+        td_errors = target - Q[i]
+        np.add.at(self.td_sum, i, td_errors)
+        np.add.at(self.td_count, i, 1)
+        Q[i] += self.alpha * self.td_sum[i] / self.td_count[i]
+        self.td_sum[i] = 0
+        self.td_count[i] = 0
+        return td_errors
+
+    def take_action(self, state, exploration=True):
+        return "jump" if self.act(self.index_of(state), exploration) else " "
+
+    def learn(self, state, reward, done=False):
+        self.learn_index(self.index_of(state), reward, done)
+
+
+def compile_policy(Q, rng):
+    """
+    the greedy action of every flat state as a uint8 array, ties drawn at random once.
+    returns (policy, tied states) so the tied states can be drawn again later.
+    """
+    q_values = Q.reshape(-1, NUM_ACTIONS)
+    policy = q_values.argmax(axis=1).astype(np.uint8)
+    ties = np.flatnonzero(q_values[:, 0] == q_values[:, 1])
+    policy[ties] = rng.integers(0, NUM_ACTIONS, ties.size)
+    return policy, ties
+
+
+class PolicyAgent(FlatQ_learn):
+    """
+    play-only agent (LEARNING = False): the Q-table is compiled once by compile_policy(),
+    so a decision is a single lookup in a uint8 array.
+    ties between the two actions are drawn again at every new episode.
+    """
+    def __init__(self, state, Q=None, rng=None):
+        super().__init__(state, Q, rng)
+        self.policy, self.ties = compile_policy(self.Q, self.rng)
+
+    def reset(self):
+        super().reset()
+        self.policy[self.ties] = self.rng.integers(0, NUM_ACTIONS, self.ties.size)
+
+    def act(self, state_index, exploration=False):
+        self.action_index = self.policy[state_index]
+        return self.action_index
+
+    def take_action(self, state, exploration=False):
+        return "jump" if self.policy[self.index_of(state)] else " "
 
 
 if __name__ == "__main__":
-    state = {
-        'bird_y': 155,
-        'bird_v': 5,
-        'pipe_positions': (50, 100),
-        'score': 500,
-        'game_state': 5
-    }
-    obj = Q_learn(state)
+    # micro-benchmark: latency of one decision (take_action + learn) for both backends
+    import time
+
+    rng = np.random.default_rng(0)
+    states = [{
+        'bird_y': y,
+        'bird_v': v,
+        'pipe_positions': (x, g),
+        'score': 0,
+        'game_state': "main"
+    } for y, v, x, g in zip(rng.uniform(160, 700, 10000).tolist(), rng.uniform(-5, 3, 10000).tolist(),
+                            rng.uniform(90, 640, 10000).tolist(), rng.integers(350, 501, 10000).tolist())]
+    for backend in (Q_learn, FlatQ_learn):
+        agent = backend(states[0], np.zeros(NUM_STATES + (NUM_ACTIONS,)))
+        start = time.perf_counter()
+        for state in states:
+            agent.take_action(state)
+            agent.learn(state, 10)
+        elapsed = time.perf_counter() - start
+        if backend is FlatQ_learn:
+            indexes = [agent.index_of(state) for state in states]
+            start = time.perf_counter()
+            for state_index in indexes:
+                agent.act(state_index)
+                agent.learn_index(state_index, 10)
+            print(f"{'FlatQ_learn (indexes)':22s}: {(time.perf_counter() - start) / len(states) * 1e6:.2f} us/decision")
+        print(f"{backend.__name__:22s}: {elapsed / len(states) * 1e6:.2f} us/decision")
 
+    # play mode (no learning): latency of take_action(state, exploration=False)
+    Q = np.random.default_rng(1).integers(-5, 5, NUM_STATES + (NUM_ACTIONS,)).astype(float)
+    for backend in (Q_learn, PolicyAgent):
+        agent = backend(states[0], Q)
+        start = time.perf_counter()
+        for state in states:
+            agent.take_action(state, False)
+        elapsed = time.perf_counter() - start
+        print(f"{backend.__name__ + ' (play)':22s}: {elapsed / len(states) * 1e6:.2f} us/decision")
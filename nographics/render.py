@@ -0,0 +1,245 @@
+"""
+Software renderer: draws batches of game states into NumPy RGB frames, no display or GPU needed.
+
+The scene is the one of Flappy_Bird.py (background, pipes, base, score, rotated bird),
+composited with array operations over all the games at once. Sprites are decoded with pygame
+(headless) and scaled to their on-screen size once, then every frame is a few gathers and alpha blends.
+A downscaled frame is rendered directly at its size (nearest neighbour), not shrunk afterwards.
+
+usage:  python render.py [games] [steps] [downscale]   -> frames/sec rendering VecFlappyEnv games
+"""
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from classes import *
+
+SPRITES_DIR = Path(__file__).resolve().parent.parent / "assets" / "sprites"
+CHUNK = 64  # games composited together (bounds the size of the temporary arrays)
+LUMA = (77, 150, 29)  # 256 * (0.299, 0.587, 0.114): grayscale = LUMA . RGB / 256
+# on-screen geometry, as drawn by Flappy_Bird.py
+BACKGROUND_TOP = SCREENHEIGHT + 5
+PIPE_BOTTOM = -300
+PIPE_TOP = SCREENHEIGHT + 400
+DIGIT_WIDTH, DIGIT_HEIGHT, DIGIT_BOTTOM = 40, 60, 0.85 * SCREENHEIGHT
+BIRD_WIDTH, BIRD_HEIGHT = 52, 40
+
+
+def load_sprites(directory=SPRITES_DIR):
+    """{file name without .png: RGBA array (height, width, 4), first row at the top}"""
+    from pygame import image
+
+    sprites = {}
+    for path in sorted(Path(directory).glob("*.png")):
+        img = image.load(str(path))
+        sprites[path.stem] = np.frombuffer(image.tostring(img, "RGBA", False), dtype=np.uint8).reshape(
+            img.get_height(), img.get_width(), 4)
+    return sprites
+
+
+def texture_rows(y, bottom, top, height, flip=False):
+    """
+    rows of a texture of "height" rows stretched over [bottom, top), seen at the heights y
+    (bottom-up, like GL). -1 outside of the quad.
+    """
+    v = (y - bottom) / (top - bottom)
+    rows = ((v if flip else 1 - v) * height).astype(np.int64)
+    return np.where((v >= 0) & (v < 1), np.clip(rows, 0, height - 1), -1)
+
+
+def is_binary(pixels):
+    """True if the alpha of the RGBA "pixels" is only 0 or 255"""
+    return bool(np.isin(pixels[..., 3], (0, 255)).all())
+
+
+def resize(pixels, height, width):
+    """nearest neighbour resize"""
+    rows = (np.arange(height) + 0.5) * pixels.shape[0] // height
+    cols = (np.arange(width) + 0.5) * pixels.shape[1] // width
+    return pixels[rows.astype(np.int64)[:, None], cols.astype(np.int64)]
+
+
+def blend(dst, src, binary=False):
+    """
+    alpha blend RGBA "src" over RGB "dst" (uint8).
+    binary: the alpha of src is only 0 or 255, a select is enough.
+    """
+    if binary:
+        return np.where(src[..., 3:] >= 128, src[..., :3], dst)
+    alpha = src[..., 3:].astype(np.uint16)
+    x = src[..., :3] * alpha + dst * (255 - alpha) + 128
+    return ((x + (x >> 8)) >> 8).astype(np.uint8)  # x / 255 without a division
+
+
+class SoftwareRenderer:
+    def __init__(self, sprites=None, downscale=1, grayscale=False):
+        """
+        sprites: {name: RGBA array} as load_sprites() gives them (loaded from assets/sprites by default).
+        frames are (N, SCREENHEIGHT // downscale, SCREENWIDTH // downscale, 3) uint8 RGB,
+        or (N, height, width) luma with grayscale.
+        """
+        if sprites is None:
+            sprites = load_sprites()
+        k = self.k = downscale
+        self.grayscale = grayscale
+        h, w = self.h, self.w = SCREENHEIGHT // k, SCREENWIDTH // k
+        # centres of the pixels of a frame in game units (y bottom-up)
+        self.y = (h - 1 - np.arange(h) + 0.5) * k
+        self.x = (np.arange(w) + 0.5) * k
+        # ######## everything scaled once to its size on the frame ##########
+        bg = sprites["background-day"]
+        bg_rows = texture_rows(self.y, 0, BACKGROUND_TOP, bg.shape[0])
+        self.background = bg[bg_rows[:, None], (self.x / SCREENWIDTH * bg.shape[1]).astype(np.int64), :3]
+        # the pipe is only stretched vertically, by a different amount for every gap: keep its rows
+        self.pipe = resize(sprites["pipe-green"], sprites["pipe-green"].shape[0], round(Pipe().width / k))
+        self.gap_size = Pipe().gap_size
+        # the base: two copies of the texture along 2 * SCREENWIDTH + 5, BASEY high
+        base = Base()
+        self.base_period = base.width / 2
+        self.base = resize(sprites["base"], round(base.top / k), round(self.base_period / k))
+        digit_height = round(DIGIT_HEIGHT / k)
+        self.digits = np.stack([resize(sprites[f"{i}"], digit_height, round(DIGIT_WIDTH / k)) for i in range(10)])
+        top = h - round((DIGIT_BOTTOM + DIGIT_HEIGHT) / k)
+        self.digit_rows = slice(top, top + digit_height)
+        self.birds = [sprites["up"], sprites["mid"], sprites["down"]]
+        # sprites drawn with a select instead of a blend (see blend)
+        self.pipe_binary = is_binary(self.pipe)
+        self.base_binary = is_binary(self.base)
+        self.digits_binary = is_binary(self.digits)
+        self.bird_binary = all(is_binary(bird) for bird in self.birds)
+        self.bird_centre_x = Bird().left + BIRD_WIDTH / 2
+        box = int(np.ceil(np.hypot(BIRD_WIDTH, BIRD_HEIGHT) / k)) + 2  # square holding the rotated bird
+        self.box_offsets = np.arange(box) - box // 2
+
+    # ######## one layer at a time, "frames" has a spare row and column (index h, w) ########
+    # pixels falling outside of the frame are written there, so scatters never collide.
+    def draw_pipes(self, frames, games, left, gap_y, valid):
+        h, w = self.h, self.w
+        height, width = self.pipe.shape[:2]
+        for p in range(left.shape[1]):
+            if not valid[:, p].any():
+                continue
+            lower = texture_rows(self.y[None, :], PIPE_BOTTOM, gap_y[:, p, None] - self.gap_size * 0.5, height)
+            upper = texture_rows(self.y[None, :], gap_y[:, p, None] + self.gap_size * 0.5, PIPE_TOP,
+                                 height, flip=True)  # upper pipe "image is reflected"
+            rows = np.where(lower >= 0, lower, upper)  # (games, h)
+            src = self.pipe[rows]  # (games, h, width, 4)
+            src[..., 3] *= (rows >= 0)[:, :, None] & valid[:, p, None, None]
+            cols = np.floor(left[:, p, None] / self.k).astype(np.int64) + np.arange(width)
+            cols = np.where((cols >= 0) & (cols < w), cols, w)
+            dst = frames[games[:, None], :h, cols]  # (games, width, h, 3)
+            frames[games[:, None], :h, cols] = blend(dst, src.transpose(0, 2, 1, 3), self.pipe_binary)
+
+    def draw_base(self, frames, games, base_right):
+        h, w = self.h, self.w
+        base_left = base_right - 2 * self.base_period
+        cols = (self.x[None, :] - base_left[:, None]) % self.base_period / self.base_period * self.base.shape[1]
+        src = self.base[:, cols.astype(np.int64)].transpose(1, 0, 2, 3)  # (games, base rows, w, 4)
+        rows = slice(h - self.base.shape[0], h)
+        frames[games, rows, :w] = blend(frames[games, rows, :w], src, self.base_binary)
+
+    def draw_score(self, frames, games, score):
+        w = self.w
+        width = self.digits.shape[2]
+        digits = [str(s) for s in score]
+        length = np.array([len(d) for d in digits])
+        for i in range(length.max()):
+            has = length > i
+            value = np.array([int(d[i]) if len(d) > i else 0 for d in digits])
+            left = np.round((0.5 * SCREENWIDTH - length / 2 * DIGIT_WIDTH + i * DIGIT_WIDTH) / self.k)
+            cols = left.astype(np.int64)[:, None] + np.arange(width)
+            cols = np.where(has[:, None] & (cols >= 0) & (cols < w), cols, w)
+            src = self.digits[value].transpose(0, 2, 1, 3)  # (games, digit width, digit height, 4)
+            dst = frames[games[:, None], self.digit_rows, cols]
+            frames[games[:, None], self.digit_rows, cols] = blend(dst, src, self.digits_binary)
+
+    def draw_bird(self, frames, games, bird_bottom, bird_angle, bird_frame):
+        h, w, k = self.h, self.w, self.k
+        offsets = self.box_offsets
+        cx, cy = self.bird_centre_x, bird_bottom + BIRD_HEIGHT / 2
+        ox = int(cx // k)
+        oy = (cy // k).astype(np.int64)
+        # centres of the pixels of the box around the bird, relative to the bird's centre
+        dx = ((ox + offsets + 0.5) * k - cx)[None, None, :]
+        dy = ((oy[:, None] + offsets + 0.5) * k - cy[:, None])[:, :, None]
+        # rotate back by the bird's angle to find the texture coordinates
+        angle = np.radians(bird_angle)[:, None, None]
+        c, s = np.cos(angle), np.sin(angle)
+        u = (c * dx + s * dy) / BIRD_WIDTH + 0.5
+        v = (-s * dx + c * dy) / BIRD_HEIGHT + 0.5
+
+        src = np.zeros(u.shape + (4,), dtype=np.uint8)
+        for i, tex in enumerate(self.birds):
+            sel = bird_frame == i
+            if not sel.any():
+                continue
+            th, tw = tex.shape[:2]
+            rows = np.clip(((1 - v[sel]) * th).astype(np.int64), 0, th - 1)
+            cols = np.clip((u[sel] * tw).astype(np.int64), 0, tw - 1)
+            src[sel] = tex[rows, cols]
+        src[..., 3] *= (u >= 0) & (u < 1) & (v >= 0) & (v < 1)
+
+        rows = h - 1 - (oy[:, None] + offsets)  # frame row of every box row
+        rows = np.where((rows >= 0) & (rows < h), rows, h)
+        cols = ox + offsets
+        cols = np.where((cols >= 0) & (cols < w), cols, w)
+        index = games[:, None, None], rows[:, :, None], cols[None, None, :]
+        frames[index] = blend(frames[index], src, self.bird_binary)
+
+    def render(self, bird_bottom, bird_angle, pipe_left, pipe_gap_y, pipe_valid, base_right, score, bird_frame=None):
+        """
+        frames of N games: every argument has one row per game, pipes have one column per pipe
+        (pipe_valid tells the pipes that are on the screen). bird_frame picks the wings
+        (0: up, 1: mid, 2: down, mid by default).
+        """
+        n = len(bird_bottom)
+        if bird_frame is None:
+            bird_frame = np.ones(n, dtype=np.int64)
+        frames = np.empty((n, self.h + 1, self.w + 1, 3), dtype=np.uint8)
+        frames[:, :self.h, :self.w] = self.background
+        for start in range(0, n, CHUNK):
+            part = slice(start, start + CHUNK)
+            games = np.arange(n)[part]
+            self.draw_pipes(frames, games, np.asarray(pipe_left)[part], np.asarray(pipe_gap_y)[part],
+                            np.asarray(pipe_valid)[part])
+            self.draw_base(frames, games, np.asarray(base_right)[part])
+            self.draw_score(frames, games, np.asarray(score)[part])
+            self.draw_bird(frames, games, np.asarray(bird_bottom, dtype=np.float64)[part],
+                           np.asarray(bird_angle, dtype=np.float64)[part], np.asarray(bird_frame)[part])
+        frames = frames[:, :self.h, :self.w]
+        if self.grayscale:
+            r, g, b = (frames[..., i].astype(np.uint16) for i in range(3))
+            return ((LUMA[0] * r + LUMA[1] * g + LUMA[2] * b + 128) >> 8).astype(np.uint8)
+        return frames
+
+    def render_env(self, env):
+        """frames of all the games of a vec_env.VecFlappyEnv"""
+        slots = (np.arange(env.MAX_PIPES)[None, :] - env.pipe_head[:, None]) % env.MAX_PIPES
+        return self.render(env.bird_bottom, env.bird_angle, env.pipe_left, env.pipe_gap_y,
+                           slots < env.pipe_num[:, None], env.base_right, env.score)
+
+    def render_game(self, game):
+        """frame of one FlappyBirdGame (main.py)"""
+        pipes = game.pipes
+        return self.render([game.bird.bottom], [game.bird.angle], [[p.left for p in pipes]],
+                           [[p.gap_y for p in pipes]], [[True] * len(pipes)], [game.base.right],
+                           [game.SCORE])[0]
+
+
+def benchmark(num_envs=256, steps=20, downscale=1):
+    from vec_env import VecFlappyEnv
+
+    renderer = SoftwareRenderer(downscale=downscale)
+    env = VecFlappyEnv(num_envs, seed=0)
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    for _ in range(steps):
+        env.step(rng.random(num_envs) < 0.1)
+        frames = renderer.render_env(env)
+    elapsed = time.perf_counter() - start
+    print(f"{num_envs} games, frames of {frames.shape[1:]}: {num_envs * steps / elapsed:.0f} frames/sec")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    benchmark(*args)
@@ -0,0 +1,90 @@
+"""
+Offline solver: estimate the MDP of the discretized game from logged transitions and solve it
+with value iteration, instead of learning it online with epsilon-greedy play.
+
+usage:
+    python solve.py collect [games] [steps] [epsilon]   -> logs transitions to experience.npz
+    python solve.py [experience.npz]                    -> writes q_table_solved.npy
+"""
+import sys
+import time
+import numpy as np
+from qlearn_agent import *
+from vec_env import VecFlappyEnv
+from vec_train import state_indices, game_state
+
+EXPERIENCE_FILE = cur_path + "/experience.npz"
+SOLVED_FILE = cur_path + "/q_table_solved.npy"
+
+
+def collect(num_envs=1024, steps=2000, epsilon=0.1, path=EXPERIENCE_FILE):
+    """play headless games (epsilon-greedy on the current q_table.npy) and save every transition"""
+    env = VecFlappyEnv(num_envs)
+    state = env.get_state()
+    agent = FlatQ_learn(game_state(state))
+    log = {key: [] for key in ("states", "actions", "rewards", "next_states", "dones")}
+    state_idx = state_indices(state)
+    for _ in range(steps):
+        actions = agent.act_batch(state_idx, epsilon)
+        next_state, rewards, dones = env.step(actions)
+        for key, value in zip(log, (state_idx, actions, rewards, state_indices(next_state), dones)):
+            log[key].append(value)
+        state_idx = state_indices(env.get_state())
+    np.savez_compressed(path, **{key: np.concatenate(value) for key, value in log.items()})
+    print(f"{num_envs * steps} transitions, {env.num_episodes} episodes saved in {path}")
+
+
+def build_model(states, actions, rewards, next_states, dones):
+    """
+    sparse empirical model over flat (state, action) pairs sa = NUM_ACTIONS * state + action:
+    mean reward R[sa] and the (sa, next state, probability) triplets of P in COO form.
+    episode ends have no successor, so their probability mass is simply missing (no future).
+    """
+    num_sa = np.prod(NUM_STATES) * NUM_ACTIONS
+    sa = NUM_ACTIONS * states + actions
+    visits = np.bincount(sa, minlength=num_sa)
+    R = np.bincount(sa, weights=rewards, minlength=num_sa) / np.maximum(visits, 1)
+
+    go_on = ~dones.astype(bool)
+    pairs, counts = np.unique(sa[go_on] * np.prod(NUM_STATES) + next_states[go_on], return_counts=True)
+    rows, cols = np.divmod(pairs, np.prod(NUM_STATES))
+    probabilities = counts / visits[rows]
+    return R, rows, cols, probabilities, visits > 0
+
+
+def value_iteration(R, rows, cols, probabilities, gamma, tol=1e-6, max_iterations=10_000):
+    """Q <- R + gamma * P max_a Q until the Bellman residual (max change) is below tol"""
+    Q = np.zeros((R.size // NUM_ACTIONS, NUM_ACTIONS))
+    residual = np.inf
+    iterations = 0
+    while residual > tol and iterations < max_iterations:
+        V = Q.max(axis=1)
+        new_Q = R + gamma * np.bincount(rows, weights=probabilities * V[cols], minlength=R.size)
+        new_Q = new_Q.reshape(Q.shape)
+        residual = np.abs(new_Q - Q).max()
+        Q = new_Q
+        iterations += 1
+    return Q, iterations, residual
+
+
+def solve(path=EXPERIENCE_FILE, out=SOLVED_FILE, gamma=0.5):  # same discount as Q_learn
+    data = np.load(path)
+    start = time.perf_counter()
+    R, rows, cols, probabilities, visited = build_model(
+        data["states"], data["actions"], data["rewards"], data["next_states"], data["dones"])
+    Q, iterations, residual = value_iteration(R, rows, cols, probabilities, gamma)
+    elapsed = time.perf_counter() - start
+
+    np.save(out, Q.reshape(NUM_STATES + (NUM_ACTIONS,)), allow_pickle=True)
+    print(f"transitions: {len(data['states'])}, visited (state, action) pairs: {visited.sum()}/{visited.size}")
+    print(f"iterations: {iterations}, wall time: {elapsed:.3f}s, Bellman residual: {residual:.3g}")
+    print(f"Q-table saved in {out}")
+    return Q
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "collect":
+        args = [float(a) if "." in a else int(a) for a in sys.argv[2:]]
+        collect(*args)
+    else:
+        solve(*sys.argv[1:])
@@ -0,0 +1,291 @@
+import time
+import numpy as np
+from classes import *
+
+
+class VecFlappyEnv:
+    """
+    Steps N headless Flappy Bird games at once.
+
+    Every game attribute lives in a structure-of-arrays NumPy buffer (one slot per game),
+    so gravity, pipe scrolling, update_pipes, update_score and check_crash are each
+    a single array operation over all the games.
+
+    The physics follow FlappyBirdGame.update_frame in main.py frame by frame.
+    One call to step() is one agent decision followed by "frames_per_step" frames.
+    The welcome / over screens don't move anything, so they are skipped:
+    a crashed game is reset automatically at the end of the step that finished it.
+    """
+    MAX_PIPES = 4  # pipes on the screen never exceed 3 (DISTANCE = SCREENWIDTH / 2)
+
+    def __init__(self, num_envs, frames_per_step=5, seed=None):
+        self.num_envs = num_envs
+        self.frames_per_step = frames_per_step
+        self.rng = np.random.default_rng(seed)
+        # ######## same settings as FlappyBirdGame ###############
+        self.DISTANCE = SCREENWIDTH / 2  # distance between pipes
+        self.BP_SPEED = -4
+        self.ANGULAR_SPEED = 3
+        self.JUMP_VELOCITY = 3
+        self.GRAVITY = -0.2
+        # shapes are taken from the scalar objects so both engines share the same numbers
+        bird = Bird(self.GRAVITY, self.ANGULAR_SPEED)
+        pipe = Pipe()
+        base = Base()
+        self.bird_left = bird.left
+        self.bird_right = bird.right
+        self.bird_height = bird.height
+        self.pipe_width = pipe.width
+        self.gap_size = pipe.gap_size
+        self.base_width = base.width
+        self.base_i_right = base.right
+        # a reset game plays (frames_per_step - 1) frames before its first decision, always the same ones:
+        # the bird after them is taken from the scalar Bird, the first pipe can't be passed or followed yet
+        if (frames_per_step - 1) * -self.BP_SPEED >= SCREENWIDTH - self.DISTANCE:
+            raise ValueError(f"frames_per_step={frames_per_step}: a second pipe would come before the first decision")
+        bird.velocity = self.JUMP_VELOCITY  # welcome screen ends with a jump
+        for _ in range(frames_per_step - 1):
+            bird.move()
+        self.reset_bird = (bird.bottom, bird.top, bird.velocity, bird.angle)
+        self.reset_pipe_left = SCREENWIDTH + (frames_per_step - 1) * self.BP_SPEED
+        ###########################################################
+        n = num_envs
+        self.all = np.ones(n, dtype=bool)
+        self.arange = np.arange(n)
+        # bird buffers
+        self.bird_bottom = np.empty(n)
+        self.bird_top = np.empty(n)
+        self.bird_velocity = np.empty(n)
+        self.bird_angle = np.empty(n)
+        # pipes: they are spawned DISTANCE apart and scroll together, so only the first one
+        # ("head", self.pipes[0] of the scalar game) moves, the others are DISTANCE, 2 * DISTANCE... after it.
+        # their gaps are kept in a small ring per game.
+        self.head_left = np.zeros(n)
+        self.head_low = np.zeros(n)  # lower_y / upper_y of the head pipe
+        self.head_high = np.zeros(n)
+        self.head_count = np.zeros(n, dtype=bool)  # the bird has passed the head pipe
+        self.pipe_gap_y = np.zeros((n, self.MAX_PIPES))
+        self.pipe_head = np.zeros(n, dtype=np.int64)
+        self.pipe_num = np.zeros(n, dtype=np.int64)
+        # base & scores
+        self.moves = np.zeros(n, dtype=np.int64)  # frames played since the start, the base moves with them
+        self.episode_start = np.zeros(n, dtype=np.int64)  # self.moves at the start of the episode
+        self.score = np.zeros(n, dtype=np.int64)
+        self.previous_score = np.zeros(n, dtype=np.int64)
+        self.final_score = np.zeros(n, dtype=np.int64)  # score of the last finished episode
+        self.num_episodes = 0
+        # per frame scrolling and gravity of the running games (0 for the crashed ones)
+        self.shift = np.empty(n)
+        self.gravity = np.empty(n)
+        # scratch buffers of update_frame
+        self.tmp = np.empty(n)
+        self.tmp_mask = np.empty(n, dtype=bool)
+
+        self.reset()
+
+    def random_gaps(self, size):
+        # same range as classes.random_gap()
+        return self.rng.integers(int(BASEY) + 206, SCREENHEIGHT - 220, size, endpoint=True)
+
+    @property
+    def frames(self):
+        """frames played in the current episode"""
+        return self.moves - self.episode_start
+
+    @property
+    def pipe_left(self):
+        """left side of the pipes in their ring slots (the slots after pipe_num pipes aren't on the screen)"""
+        rank = (np.arange(self.MAX_PIPES)[None, :] - self.pipe_head[:, None]) % self.MAX_PIPES
+        return self.head_left[:, None] + self.DISTANCE * rank
+
+    @property
+    def base_right(self):
+        """Base.move(BP_SPEED) "moves" times from the initial base"""
+        speed = -self.BP_SPEED
+        wrap = SCREENWIDTH + 1
+        first = max(-(-(self.base_i_right - wrap) // speed), 0)  # frames before the first wrap
+        period = -(-(2 * SCREENWIDTH - wrap) // speed)  # frames between two wraps
+        after = np.maximum(self.moves - first, 0)
+        return np.where(self.moves <= first, self.base_i_right - speed * self.moves,
+                        2 * SCREENWIDTH - speed * ((after - 1) % period + 1)).astype(np.float64)
+
+    # ################# reset ####################################################
+    def reset(self, mask=None):
+        """
+        reset the games selected by mask (all of them by default) to the first frame
+        at which the scalar game asks the agent for a decision.
+        """
+        if mask is None:
+            mask = self.all
+        count = int(np.count_nonzero(mask))
+        if count == 0:
+            return
+        self.bird_bottom[mask], self.bird_top[mask], self.bird_velocity[mask], self.bird_angle[mask] = self.reset_bird
+
+        self.pipe_head[mask] = 0
+        self.pipe_num[mask] = 1
+        gaps = self.random_gaps(count)
+        self.pipe_gap_y[mask, 0] = gaps
+        self.head_left[mask] = self.reset_pipe_left
+        self.head_low[mask] = gaps - self.gap_size * 0.5
+        self.head_high[mask] = gaps + self.gap_size * 0.5
+        self.head_count[mask] = False
+
+        self.score[mask] = 0
+        self.moves[mask] += self.frames_per_step - 1
+        self.episode_start[mask] = self.moves[mask] - (self.frames_per_step - 1)
+
+    # ################# game loop ################################################
+    def step(self, actions):
+        """
+        take one decision per game (1 -> "jump", 0 -> " ") and run "frames_per_step" frames.
+        returns (state, reward, done) where state is the state at the next decision
+        (the crash state for finished games). finished games are reset afterwards.
+        """
+        jump = np.asarray(actions, dtype=bool)
+        self.bird_velocity[jump] = self.JUMP_VELOCITY
+
+        alive = self.all.copy()
+        self.shift.fill(self.BP_SPEED)
+        self.gravity.fill(self.GRAVITY)
+        for _ in range(self.frames_per_step):
+            crashed = self.update_frame(alive)
+            if crashed.any():
+                # crashed games stay on their crash frame until the end of the step
+                alive &= ~crashed
+                self.shift[crashed] = 0
+                self.gravity[crashed] = 0
+        done = ~alive
+
+        state = self.get_state()
+        reward = self.get_reward(state, done)
+
+        if done.any():
+            self.final_score[done] = self.score[done]
+            self.num_episodes += int(np.count_nonzero(done))
+            self.reset(done)
+        return state, reward, done
+
+    def update_frame(self, mask):
+        """
+        move the games selected by mask one frame forward, returns the crash mask.
+        self.shift and self.gravity must be 0 for the games outside of mask.
+        """
+        self.moves += mask
+        self.head_left += self.shift
+        self.update_pipes(mask)
+        self.update_score(mask)
+        self.move_bird(mask)
+        return self.check_crash(mask)
+
+    def move_bird(self, mask):
+        # a running game's bird is above the base (it crashes otherwise), it always moves
+        v, angle, tmp = self.bird_velocity, self.bird_angle, self.tmp
+        np.multiply(v, mask, out=tmp)
+        self.bird_bottom += tmp
+        self.bird_top += tmp
+        # control angle variation
+        up = mask & (v >= 0)
+        turn = np.where(up, np.where(angle < 30, self.ANGULAR_SPEED, 0),
+                        np.where(mask & (angle > -90), -self.ANGULAR_SPEED * 0.3, 0))
+        angle += turn
+
+        np.greater_equal(self.bird_top, SCREENHEIGHT, out=self.tmp_mask)
+        self.tmp_mask &= mask
+        v[self.tmp_mask] = 0
+        v += self.gravity
+
+    def update_pipes(self, mask):
+        pop = self.head_left < -self.pipe_width
+        if pop.any():
+            pop &= mask
+            self.head_left[pop] += self.DISTANCE
+            self.pipe_head[pop] = (self.pipe_head[pop] + 1) % self.MAX_PIPES
+            self.pipe_num[pop] -= 1
+            self.head_count[pop] = False
+            gaps = self.pipe_gap_y[self.arange[pop], self.pipe_head[pop]]
+            self.head_low[pop] = gaps - self.gap_size * 0.5
+            self.head_high[pop] = gaps + self.gap_size * 0.5
+
+        # a new pipe when the last one is at DISTANCE (crashed games: the last one is further)
+        last = self.head_left + self.DISTANCE * (self.pipe_num - 1)
+        push = last <= self.DISTANCE
+        if push.any():
+            push &= mask
+            games = self.arange[push]
+            slots = (self.pipe_head[push] + self.pipe_num[push]) % self.MAX_PIPES
+            self.pipe_gap_y[games, slots] = self.random_gaps(games.size)
+            self.pipe_num[push] += 1
+
+    def update_score(self, mask):
+        # increase score if all bird's body crossed the pipe's right side
+        passed = self.head_left <= self.bird_left - self.pipe_width
+        passed &= ~self.head_count
+        passed &= mask
+        self.score += passed
+        self.head_count |= passed
+
+    def check_crash(self, mask):
+        left = self.head_left
+        inside = (left < self.bird_right) & (left > self.bird_left - self.pipe_width)
+        hit = (self.bird_bottom < self.head_low) | (self.bird_top > self.head_high)
+        # crash with a pipe or with the ground
+        return mask & ((inside & hit) | (self.bird_bottom <= BASEY))
+
+    # ################# AI agent methods #########################################
+    def next_pipe(self):
+        """slot of the pipe the bird should focus on (the first one it hasn't passed)"""
+        return (self.pipe_head + self.head_count) % self.MAX_PIPES
+
+    def get_state(self):
+        # Same keys as FlappyBirdGame.get_state(), every value is an array over the games
+        slot = self.next_pipe()
+        return {
+            'bird_y': (self.bird_bottom + self.bird_top) / 2,
+            'bird_v': self.bird_velocity.copy(),
+            'pipe_positions': (self.head_left + self.DISTANCE * self.head_count + self.pipe_width * 0.5,
+                               self.pipe_gap_y[self.arange, slot]),
+            'score': self.score.copy(),
+        }
+
+    def get_reward(self, state, done):
+        # vectorized FlappyBirdGame.get_reward()
+        bird_centre = state['bird_y']
+        bird_v = state['bird_v']
+        gap_x = state['pipe_positions'][0] - self.pipe_width * 0.5
+        gap_y = state['pipe_positions'][1]
+        gap_top = gap_y + self.gap_size * 0.5
+        gap_down = gap_y - self.gap_size * 0.5
+        bird_height = self.bird_height
+        gap_size_quarter = self.gap_size * 0.35
+
+        # score bonus
+        bonus = ~done & (self.score > self.previous_score)
+        self.previous_score[bonus] = self.score[bonus]
+
+        centre = (gap_down + gap_size_quarter <= bird_centre) & (bird_centre <= gap_top - gap_size_quarter)
+        within = (gap_down + bird_height <= bird_centre) & (bird_centre <= gap_top - bird_height)
+        lower = bird_centre < gap_down + bird_height
+        distance_x = gap_x - self.bird_right
+        lower_reward = np.where(gap_down - bird_centre < distance_x, np.where(bird_v <= 0, -10, 10), -10)
+        higher_reward = np.where(bird_centre - gap_top < distance_x, np.where(bird_v > 0, -10, 10), -10)
+        within_reward = (20 + 10 * ((bird_centre < gap_y) & (bird_v >= 0))
+                         + 10 * ((bird_centre > gap_y) & (bird_v <= 0)))
+
+        reward = np.select([centre, within, lower], [60, within_reward, lower_reward], higher_reward)
+        reward = reward + 100 * bonus
+        reward[done] = -200
+        return reward
+
+
+if __name__ == "__main__":
+    # frames per second of random play over N games
+    for n in (1, 64, 1024, 8192):
+        env = VecFlappyEnv(n, seed=0)
+        rng = np.random.default_rng(0)
+        steps = 200
+        start = time.perf_counter()
+        for _ in range(steps):
+            env.step(rng.random(n) < 0.1)
+        elapsed = time.perf_counter() - start
+        print(f"N={n:5d}: {n * steps * env.frames_per_step / elapsed:12.0f} frames/sec")
@@ -0,0 +1,66 @@
+"""
+Batched Q-learning: one FlatQ_learn agent learns from all the games of a VecFlappyEnv at once,
+every step feeds "games" transitions to learn_batch().
+
+usage:  python vec_train.py [games] [seconds]
+"""
+import sys
+import time
+import numpy as np
+from qlearn_agent import *
+from vec_env import VecFlappyEnv
+
+REPORT_PERIOD = 5  # seconds between two progress lines
+
+
+def state_indices(state):
+    return flat_state_indices(state['bird_y'], state['bird_v'], *state['pipe_positions'])
+
+
+def game_state(state, i=0):
+    # the state dict of one game, as FlappyBirdGame.get_state() gives it
+    return {
+        'bird_y': state['bird_y'][i],
+        'bird_v': state['bird_v'][i],
+        'pipe_positions': (state['pipe_positions'][0][i], state['pipe_positions'][1][i]),
+        'score': state['score'][i],
+    }
+
+
+def train(num_envs=1024, duration=None):
+    env = VecFlappyEnv(num_envs)
+    state = env.get_state()
+    agent = FlatQ_learn(game_state(state))
+    state_idx = state_indices(state)
+
+    highest_score = 0
+    start = last_report = time.perf_counter()
+    steps = 0
+    try:
+        while duration is None or time.perf_counter() - start < duration:
+            actions = agent.act_batch(state_idx)
+            next_state, rewards, dones = env.step(actions)
+            agent.learn_batch(state_idx, actions, rewards, state_indices(next_state), dones)
+            # finished games have been reset by the env: start from their new state
+            state_idx = state_indices(env.get_state())
+            steps += 1
+
+            if dones.any():
+                highest_score = max(highest_score, int(env.final_score[dones].max()))
+            now = time.perf_counter()
+            if now - last_report >= REPORT_PERIOD:
+                frames = steps * num_envs * env.frames_per_step
+                print(f"Episodes: {env.num_episodes}, Highest Score= {highest_score}, "
+                      f"frames/sec: {frames / (now - last_report):.0f}")
+                last_report, steps = now, 0
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("=" * 20)
+        print("Saving data...")
+        agent.save_q_table()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    train(*args)
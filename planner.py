@@ -0,0 +1,74 @@
+import heapq
+import numpy as np
+
+
+class PrioritizedSweeping:
+    """
+    Model-based planning (Dyna-Q with prioritized sweeping) on a flat Q-table.
+
+    The model is learned from the real transitions: visit counts and reward sums per (state, action)
+    and the counts of the states that followed. Between two real decisions, plan() does full
+    expected backups of the (state, action) pairs whose Q-value is the farthest from what the model
+    predicts, then queues the predecessors whose prediction moved the most with it.
+    (state, action) pairs are flat: sa = num_actions * state_index + action.
+    """
+    MAX_QUEUE = 100_000  # the queue keeps stale duplicates, it's cut down to the most urgent half when too long
+
+    def __init__(self, Q_flat, gamma, num_actions=2, theta=0.1):
+        self.Q = Q_flat
+        self.gamma = gamma
+        self.num_actions = num_actions
+        self.theta = theta  # smaller priorities are not queued
+        # the model
+        self.visits = np.zeros(Q_flat.size, dtype=np.int64)
+        self.reward_sum = np.zeros(Q_flat.size)
+        self.successors = {}  # sa -> {next state: count}, episode ends have no successor
+        self.predecessors = {}  # state -> set of sa that led to it
+        # priority queue of (-priority, sa)
+        self.queue = []
+
+    def observe(self, state_index, action, reward, next_state_index, done):
+        sa = self.num_actions * state_index + action
+        self.visits[sa] += 1
+        self.reward_sum[sa] += reward
+        if not done:
+            nexts = self.successors.setdefault(sa, {})
+            nexts[next_state_index] = nexts.get(next_state_index, 0) + 1
+            self.predecessors.setdefault(next_state_index, set()).add(sa)
+        self.push(sa)
+
+    def expected_q(self, sa):
+        # reward + gamma * max Q of the next state, averaged with the model's probabilities
+        Q = self.Q
+        n = self.num_actions
+        future = 0.0
+        for next_state, count in self.successors.get(sa, {}).items():
+            future += count * max(Q[n * next_state: n * next_state + n])
+        return (self.reward_sum[sa] + self.gamma * future) / self.visits[sa]
+
+    def push(self, sa):
+        priority = abs(self.expected_q(sa) - self.Q[sa])
+        if priority > self.theta:
+            heapq.heappush(self.queue, (-priority, sa))
+
+    def plan(self, n):
+        """up to n backups, the most urgent first"""
+        Q = self.Q
+        k = self.num_actions
+        for _ in range(n):
+            if not self.queue:
+                break
+            _, sa = heapq.heappop(self.queue)
+            state = sa // k
+            old_value = max(Q[k * state: k * state + k])
+            Q[sa] = self.expected_q(sa)
+            # a predecessor's prediction moves by gamma * P(state | pred) * (change of the state's value)
+            change = self.gamma * abs(max(Q[k * state: k * state + k]) - old_value)
+            if change <= self.theta:
+                continue
+            for pred in self.predecessors.get(state, ()):
+                priority = change * self.successors[pred][state] / self.visits[pred]
+                if priority > self.theta:
+                    heapq.heappush(self.queue, (-priority, pred))
+        if len(self.queue) > self.MAX_QUEUE:
+            self.queue = heapq.nsmallest(self.MAX_QUEUE // 2, self.queue)  # a sorted list is a heap
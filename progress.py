@@ -0,0 +1,65 @@
+"""
+Progress reports: episodes are counted as they end, and one line (or one JSON record) is
+emitted per interval instead of a print per episode.
+
+a line: episodes, highest score, episodes/sec, frames/sec, mean/median/p95 score of the last
+episodes, the agent's epsilon and the norm of the change of its Q-table since the last report.
+"""
+import json
+import time
+from collections import deque
+import numpy as np
+
+REPORT_PERIOD = 5  # seconds between two reports
+WINDOW = 100  # episodes in the score statistics
+
+
+class ProgressReporter:
+    def __init__(self, emit=print, period=REPORT_PERIOD, window=WINDOW, as_json=False):
+        """emit(text) writes one report, e.g. lambda text: io.submit(print, text)"""
+        self.emit = emit
+        self.period = period
+        self.as_json = as_json
+        self.scores = deque(maxlen=window)
+        self.highest_score = 0
+        self.episodes = 0  # since the last report
+        self.frames = 0  # since the last report
+        self.last_time = time.perf_counter()
+        self.last_q = None  # copy of the Q-table at the last report
+
+    def episode(self, agent, score, frames):
+        """count an ended episode, report if the period is over"""
+        self.scores.append(score)
+        self.highest_score = max(self.highest_score, score)
+        self.episodes += 1
+        self.frames += frames
+        if time.perf_counter() - self.last_time >= self.period:
+            self.report(agent)
+
+    def report(self, agent):
+        now = time.perf_counter()
+        elapsed = max(now - self.last_time, 1e-9)
+        scores = np.fromiter(self.scores, dtype=np.float64, count=len(self.scores))
+        q = np.array(agent.Q)
+        record = {
+            "episode": int(agent.num_episodes),
+            "highest_score": int(self.highest_score),
+            "episodes_per_sec": self.episodes / elapsed,
+            "frames_per_sec": self.frames / elapsed,
+            "mean_score": float(scores.mean()) if scores.size else 0.0,
+            "median_score": float(np.median(scores)) if scores.size else 0.0,
+            "p95_score": float(np.percentile(scores, 95)) if scores.size else 0.0,
+            "epsilon": agent.epsilon,
+            "q_delta": float(np.linalg.norm(q - self.last_q)) if self.last_q is not None else 0.0,
+        }
+        self.last_q = q
+        self.last_time, self.episodes, self.frames = now, 0, 0
+        if self.as_json:
+            self.emit(json.dumps(record))
+        else:
+            self.emit(f"Episode: {record['episode']}, Highest Score= {record['highest_score']}, "
+                      f"episodes/sec: {record['episodes_per_sec']:.1f}, frames/sec: {record['frames_per_sec']:.0f}, "
+                      f"score (last {len(scores)}) mean: {record['mean_score']:.1f} "
+                      f"median: {record['median_score']:.0f} p95: {record['p95_score']:.0f}, "
+                      f"epsilon: {record['epsilon']}, |dQ|: {record['q_delta']:.3g}")
+        return record
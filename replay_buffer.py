@@ -0,0 +1,93 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    Fixed-capacity ring buffer of transitions (state_index, action, reward, next_state_index, done)
+    stored in typed NumPy arrays. When full, the oldest transition is overwritten.
+
+    prioritized=False: uniform sampling.
+    prioritized=True: a transition is drawn with probability ~ priority ** alpha,
+    new transitions get the highest priority seen so far and update_priorities()
+    sets the priority of replayed ones to their TD error.
+    priorities are kept with the sums of their blocks of ~sqrt(capacity) slots, so sampling or
+    updating k of them takes a fixed number of NumPy calls on O(k sqrt(capacity)) numbers;
+    add() adjusts one block sum by the change of priority, O(1).
+    """
+    def __init__(self, capacity=100_000, prioritized=False, alpha=0.6, seed=None):
+        self.capacity = capacity
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float64)
+        self.next_states = np.zeros(capacity, dtype=np.int64)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.prioritized = prioritized
+        self.alpha = alpha
+        # priority ** alpha of every slot, viewed as (blocks, block size), and the sum of each block
+        self.block = int(np.ceil(np.sqrt(capacity)))
+        self.blocks = -(-capacity // self.block)
+        self.priorities = np.zeros((self.blocks, self.block)) if prioritized else None
+        self.block_sums = np.zeros(self.blocks) if prioritized else None
+        self.max_priority = 1.0
+        self.rng = np.random.default_rng(seed)
+        self.pos = 0  # next slot to write
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state_index, action, reward, next_state_index, done):
+        i = self.pos
+        self.states[i] = state_index
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state_index
+        self.dones[i] = done
+        if self.prioritized:
+            b, j = divmod(i, self.block)
+            priority = self.max_priority ** self.alpha
+            self.block_sums[b] += priority - self.priorities[b, j]  # O(1): the block's sum follows the change
+            self.priorities[b, j] = priority
+        self.pos = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def add_batch(self, state_idx, actions, rewards, next_state_idx, dones):
+        # arrays of transitions, e.g. one step of a VecFlappyEnv
+        n = len(state_idx)
+        i = (self.pos + np.arange(n)) % self.capacity
+        self.states[i] = state_idx
+        self.actions[i] = actions
+        self.rewards[i] = rewards
+        self.next_states[i] = next_state_idx
+        self.dones[i] = dones
+        if self.prioritized:
+            self.set_priorities(i, self.max_priority)
+        self.pos = (self.pos + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def sample(self, k):
+        """returns the slots of k transitions (sampled with replacement)"""
+        if not self.prioritized:
+            return self.rng.integers(0, self.size, k)
+        # pick a block with probability ~ its sum, then a slot inside it
+        cumulative = np.cumsum(self.block_sums)
+        u = self.rng.random(k) * cumulative[-1]
+        b = np.minimum(np.searchsorted(cumulative, u, side='right'), self.blocks - 1)
+        u -= cumulative[b] - self.block_sums[b]
+        j = np.count_nonzero(np.cumsum(self.priorities[b], axis=1) <= u[:, None], axis=1)
+        return np.minimum(b * self.block + np.minimum(j, self.block - 1), self.size - 1)
+
+    def transitions(self, i):
+        return self.states[i], self.actions[i], self.rewards[i], self.next_states[i], self.dones[i]
+
+    def set_priorities(self, i, priorities):
+        b, j = np.divmod(i, self.block)
+        self.priorities[b, j] = priorities ** self.alpha
+        self.block_sums[b] = self.priorities[b].sum(axis=1)
+
+    def update_priorities(self, i, td_errors):
+        if self.prioritized:
+            priorities = np.abs(td_errors) + 1e-6  # never 0, so every transition can be drawn again
+            self.set_priorities(i, priorities)
+            self.max_priority = max(self.max_priority, float(priorities.max()))
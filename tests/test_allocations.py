@@ -0,0 +1,109 @@
+"""
+The headless game loop allocates nothing per frame once it's warmed up: the pipes are reused
+(PipeRing), the game objects are slotted and the random draws come from GameRNG's blocks.
+
+tracemalloc traces the process from before the game is built. The memory blocks alive after FRAMES
+more frames are counted against the ones alive before, whatever module allocated them.
+Two things may differ between the counts without any allocation per frame:
+  - the numbers held in the game's attributes are new objects as the game runs (a float or an int
+    above 256 instead of another, or of a shared constant): at most one block per such attribute.
+  - GameRNG refills a block of draws every game_rng.BLOCK draws (amortized over BLOCK pipes or
+    decisions): the new list of BLOCK numbers replaces the old one, but up to FLOAT_FREE_LIST of the
+    freed floats stay allocated for reuse by CPython. The refills during the window are counted.
+A block kept per frame, per decision or per pipe is FRAMES, FRAMES / 5 or about FRAMES / 60 blocks.
+"""
+import sys
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "nographics"))
+
+import main  # noqa: E402  (the headless main.py)
+from qlearn_agent import NUM_STATES, NUM_ACTIONS, load_q_table  # noqa: E402
+
+WARMUP_FRAMES = 20000
+FRAMES = 50000
+FLOAT_FREE_LIST = 100  # freed float objects CPython keeps for reuse
+
+
+class SteppedGame(main.FlappyBirdGame):
+    """
+    FlappyBirdGame without its game loop, stepped by the test. The end of an episode keeps its
+    records (the episodes log, the progress statistics): that's per episode, it's left out.
+    """
+    def run(self):
+        self.init_objects()
+
+    def save_data(self, force=False, skip=False):
+        pass
+
+    def step(self, frames):
+        for _ in range(frames):
+            self.update_frame()
+            self.counter -= 1
+
+
+class CountingGenerator:
+    """a NumPy Generator of GameRNG that counts the blocks drawn from it"""
+    def __init__(self, generator):
+        self.generator = generator
+        self.blocks = 0
+
+    def integers(self, *args):
+        self.blocks += 1
+        return self.generator.integers(*args)
+
+    def random(self, *args):
+        self.blocks += 1
+        return self.generator.random(*args)
+
+
+def held_numbers(game):
+    """number of int and float attributes of the game and of the objects it steps"""
+    objects = [game, game.bird, game.base, game.obs, game.agent, game.rng, *game.pipes.ring]
+    count = 0
+    for obj in objects:
+        names = list(getattr(obj, "__dict__", {}))
+        for cls in type(obj).__mro__:
+            names += getattr(cls, "__slots__", ())
+        count += sum(isinstance(getattr(obj, name, None), (int, float, np.number)) for name in set(names))
+    return count
+
+
+def live_blocks(snapshot):
+    """blocks of the snapshot, without the ones of tracemalloc and of this test"""
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                       tracemalloc.Filter(False, __file__)])
+    return sum(stat.count for stat in snapshot.statistics("filename"))
+
+
+@pytest.mark.parametrize("learning, macro_step", [(False, False), (False, True), (True, False)])
+def test_no_per_frame_allocations(learning, macro_step, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the episodes log is opened in the working directory
+    monkeypatch.setattr(main, "SEED", 7)
+    monkeypatch.setattr(main, "LEARNING", learning)
+    monkeypatch.setattr(main, "EXPLORATION", learning)
+    monkeypatch.setattr(main, "LIVE_VIEW", False)
+    monkeypatch.setattr(main, "MACRO_STEP", macro_step)
+    shape = NUM_STATES + (NUM_ACTIONS,)
+    tracemalloc.start()
+    try:
+        game = SteppedGame(np.zeros(shape) if learning else load_q_table(shape).copy())
+        try:
+            game.step(WARMUP_FRAMES)
+            gaps = game.rng.gap_generator = CountingGenerator(game.rng.gap_generator)
+            uniforms = game.rng.uniform_generator = CountingGenerator(game.rng.uniform_generator)
+            before = live_blocks(tracemalloc.take_snapshot())
+            game.step(FRAMES)
+            after = live_blocks(tracemalloc.take_snapshot())
+        finally:
+            game.io.close()
+    finally:
+        tracemalloc.stop()
+
+    refills = gaps.blocks + uniforms.blocks
+    allowed = held_numbers(game) + refills * (FLOAT_FREE_LIST + 1)
+    assert after - before <= allowed, (after - before, held_numbers(game), refills)
@@ -0,0 +1,25 @@
+"""
+The modules used by both front ends (replay_buffer.py, planner.py, ...) have one copy in the project
+directory, for Flappy_Bird.py and main.py, and one in nographics/: the two copies must stay the same.
+classes.py, main.py and qlearn_agent.py differ on purpose (drawing, the game loop).
+"""
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+NOGRAPHICS = ROOT / "nographics"
+FRONT_END_MODULES = {"classes.py", "main.py", "qlearn_agent.py"}
+
+SHARED = sorted(path.name for path in ROOT.glob("*.py")
+                if path.name not in FRONT_END_MODULES and (NOGRAPHICS / path.name).is_file())
+
+
+def test_there_are_shared_modules():
+    assert SHARED
+
+
+@pytest.mark.parametrize("name", SHARED)
+def test_shared_module_copies_are_identical(name):
+    assert (ROOT / name).read_bytes() == (NOGRAPHICS / name).read_bytes(), \
+        f"{name} and nographics/{name} differ: change both copies"
@@ -0,0 +1,114 @@
+"""
+Live viewer of a headless training run: draws the latest state published by nographics/main.py
+(LIVE_VIEW = True) in shared memory, see live_state.py.
+It can be started and closed at any time, the trainer only copies its state while a viewer is open.
+
+usage:  python viewer.py   ('q' closes it)
+"""
+from pathlib import Path
+from classes import *
+from atlas import init_atlas
+from live_state import LiveStateReader, MAX_PIPES
+
+PERIOD = 16  # ms between two frames
+
+
+class LiveViewer:
+    def __init__(self):
+        self.cur_path = str(Path(__file__).parent.resolve())
+        self.reader = LiveStateReader()
+        self.batch = None
+        self.TEXTURES = {}
+        self.bird = None
+        self.pipes = []
+        self.base = None
+        self.episode = -1  # shown in the window title
+        self.is_window_open = True
+
+        glutInit()
+        glutInitWindowPosition(10, 10)
+        glutInitWindowSize(SCREENWIDTH, SCREENHEIGHT)
+        glutInitDisplayMode(GLUT_DEPTH | GLUT_DOUBLE | GLUT_RGBA)
+        self.window = glutCreateWindow(b"Flappy Bird (waiting for a trainer)")
+        glutDisplayFunc(self.display)
+        glutKeyboardFunc(self.keyboard)
+        self.init()
+        self.frames(1)
+        glutMainLoop()
+
+    def init(self):
+        glClearColor(1, 1, 1, 0)
+        glEnable(GL_DEPTH_TEST)
+        glEnable(GL_TEXTURE_2D)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+        self.batch = SpriteBatch()
+        self.batch.texture, self.TEXTURES = init_atlas(self.cur_path + '/assets/sprites')
+        self.bird = Bird(self.TEXTURES["bird"])
+        self.pipes = [Pipe(self.TEXTURES["pipe"]) for _ in range(MAX_PIPES)]
+        self.base = Base(self.TEXTURES["base"], 0.1)
+
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        glOrtho(0, SCREENWIDTH, 0, SCREENHEIGHT, -3, 3)
+
+        glMatrixMode(GL_MODELVIEW)
+        glLoadIdentity()
+
+    def frames(self, t=1):
+        if self.is_window_open:
+            self.display()
+            glutTimerFunc(PERIOD, self.frames, t)
+
+    def display(self):
+        state = self.reader.read()
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glLoadIdentity()
+        self.batch.begin()
+        self.batch.add(0, SCREENWIDTH, 0, SCREENHEIGHT + 5, self.TEXTURES["BackG"], -1)
+        if state is not None:
+            self.draw_state(state)
+        else:
+            self.base.draw(self.batch)
+        self.batch.end()
+        glutSwapBuffers()
+
+    def draw_state(self, state):
+        if state["episode"] != self.episode:
+            self.episode = int(state["episode"])
+            glutSetWindowTitle(f"Flappy Bird - episode {self.episode}, "
+                               f"highest score {int(state['highest_score'])}".encode())
+        self.base.left, self.base.right = state["base"]
+        self.base.draw(self.batch)
+
+        game_state = int(state["game_state"])
+        if game_state == 2:  # over
+            self.batch.add(100, 500, 400, 600, self.TEXTURES["game over"], 0.5)
+            return
+        for pipe, (left, right, lower_y, upper_y) in zip(self.pipes, state["pipes"][:state["num_pipes"]]):
+            pipe.left, pipe.right, pipe.lower_y, pipe.upper_y = left, right, lower_y, upper_y
+            pipe.draw(self.batch)
+        self.bird.left, self.bird.right, self.bird.bottom, self.bird.top, self.bird.angle = state["bird"]
+        self.bird.draw(self.batch)
+        self.show_score(str(int(state["score"])))
+
+    def show_score(self, score):
+        width = 40
+        height = width * 1.5
+
+        left = 0.5 * SCREENWIDTH - len(score) / 2 * width  # centre the text.
+        for n in score:
+            self.batch.add(left, left + width, 0.85 * SCREENHEIGHT, 0.85 * SCREENHEIGHT + height,
+                           self.TEXTURES["numbers"][n], 0.5)
+            left += width
+
+    def keyboard(self, key, a, b):
+        if key == b"q":
+            self.is_window_open = False
+            self.reader.close()
+            glutDestroyWindow(self.window)
+
+
+if __name__ == "__main__":
+    LiveViewer()